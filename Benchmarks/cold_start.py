@@ -0,0 +1,64 @@
+"""Cold start of a generated library: a fresh interpreter imports it and creates an instance.
+
+The time above starting a bare interpreter is checked against BUDGET_MS and the heavy modules
+loaded by then are listed, there should be none as they are imported on first use.
+
+Run from the repository root: python -m Benchmarks.cold_start [iterations]
+"""
+import os
+import sys
+import time
+import tempfile
+import py_compile
+import subprocess
+import cv2
+import numpy
+
+from Models.BoxFunction import BoxFunction
+from Models.Library import Library
+
+BUDGET_MS = 25
+HEAVY = ("cv2", "numpy", "pyocr", "PIL", "mss", "pyautogui", "asyncio")
+
+
+def create(folder):
+    template = os.path.join(folder, "template.png")
+    cv2.imwrite(template, numpy.zeros((16, 16, 3), numpy.uint8))
+    functions = [
+        BoxFunction('gold', 'number', [0, 0, 60, 20], {'threshold': 80}),
+        BoxFunction('name', 'string', [0, 20, 60, 20], {}),
+        BoxFunction('coin', 'position', [0, 40, 200, 200], {'image': template, 'match_threshold': 80}),
+        BoxFunction('moved', 'change', [0, 0, 200, 200], {'tolerance': 5}),
+        BoxFunction('ok', 'click', [0, 0, 20, 20], {}),
+    ]
+    screen_box = {'left': 0, 'top': 0, 'width': 640, 'height': 480}
+    Library.create_library(os.path.join(folder, "cold_start.py"), screen_box, folder, functions, {})
+    py_compile.compile(os.path.join(folder, "cold_start.py"))
+
+
+def measure(folder, code, iterations):
+    subprocess.check_output([sys.executable, "-c", code], cwd=folder)
+    times = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        output = subprocess.check_output([sys.executable, "-c", code], cwd=folder)
+        times.append(time.perf_counter() - start)
+    return numpy.array(times) * 1000, output.decode().strip()
+
+
+if __name__ == "__main__":
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    with tempfile.TemporaryDirectory() as folder:
+        create(folder)
+        bare, _ = measure(folder, "pass", iterations)
+        times, loaded = measure(folder, "import sys, cold_start\n"
+                                        "cold_start.cold_start()\n"
+                                        "print(' '.join(name for name in {!r} if name in sys.modules))".format(HEAVY),
+                                iterations)
+    cost = numpy.median(times) - numpy.median(bare)
+    print("interpreter      median {:7.2f} ms".format(numpy.median(bare)))
+    print("import + init    median {:7.2f} ms   p95 {:7.2f} ms".format(numpy.median(times), numpy.percentile(times, 95)))
+    print("cold start cost  {:7.2f} ms   budget {} ms".format(cost, BUDGET_MS))
+    print("heavy modules    {}".format(loaded or "none"))
+    if cost > BUDGET_MS:
+        sys.exit("cold start over budget")
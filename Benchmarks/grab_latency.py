@@ -0,0 +1,33 @@
+"""Grab latency of a new mss context per grab (old generated libraries) against CaptureSession.
+
+Run from the repository root: python -m Benchmarks.grab_latency [iterations]
+"""
+import sys
+import time
+import numpy
+from mss import mss
+
+from Models.Runtime import CaptureSession
+
+
+def measure(grab, iterations):
+    grab()
+    times = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        grab()
+        times.append(time.perf_counter() - start)
+    return numpy.array(times) * 1000
+
+
+def grab_new_context():
+    with mss() as sct:
+        return sct.grab(sct.monitors[0])
+
+
+if __name__ == "__main__":
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    session = CaptureSession()
+    for name, grab in [("mss() per grab", grab_new_context), ("CaptureSession", session.grab)]:
+        times = measure(grab, iterations)
+        print("{:<16} mean {:7.2f} ms   p95 {:7.2f} ms".format(name, times.mean(), numpy.percentile(times, 95)))
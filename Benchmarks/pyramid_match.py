@@ -0,0 +1,36 @@
+"""Exhaustive TM_CCOEFF_NORMED against the coarse-to-fine pyramid search of Runtime.match.
+
+Run from the repository root: python -m Benchmarks.pyramid_match [iterations]
+"""
+import sys
+import time
+import cv2
+import numpy
+
+from Models.Runtime import match
+
+
+def scene(width=1920, height=1080, size=64):
+    random = numpy.random.RandomState(0)
+    image = cv2.GaussianBlur(random.randint(0, 255, (height, width, 3)).astype(numpy.uint8), (5, 5), 0)
+    template = image[500:500 + size, 1200:1200 + size].copy()
+    return image, template, (500, 1200)
+
+
+def measure(image, template, levels, iterations):
+    times = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        res = match(image, template, levels)
+        times.append(time.perf_counter() - start)
+    return numpy.array(times) * 1000, numpy.unravel_index(numpy.argmax(res), res.shape)
+
+
+if __name__ == "__main__":
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    image, template, expected = scene()
+    for levels in range(4):
+        times, found = measure(image, template, levels, iterations)
+        print("levels {}   mean {:8.2f} ms   found {} (expected {})".format(
+            levels, times.mean(), tuple(int(i) for i in found), expected
+        ))
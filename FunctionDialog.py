@@ -1,31 +1,38 @@
 from Models.BoxFunction import BoxFunction
+from Models.Runtime import binarize, load_template, ocr_tool
+from Models.Tuning import sample, tune_match, tune_text
 
-import cv2
-import numpy
-from PyQt5 import uic, QtWidgets, QtGui
+from PyQt5 import uic, QtWidgets, QtGui, QtCore
 from PyQt5.QtWidgets import QFileDialog, QMessageBox
 from ImageViewerQt import ImageViewerQt
-from PIL import Image, ImageFilter
-from PIL.ImageQt import ImageQt
 
 
 class FunctionDialog(QtWidgets.QDialog):
-    def __init__(self, box, folder, current_view, function=None):
+    def __init__(self, box, recording, current_view, function=None):
         super(FunctionDialog, self).__init__()
         uic.loadUi('./Design/BoxDialog.ui', self)
         self.get_text_widget = uic.loadUi('./Design/Get_text.ui')
         self.match_img_widget = uic.loadUi('./Design/Match_img.ui')
+        self.has_changed_widget = uic.loadUi('./Design/Has_changed.ui')
 
         self.buttonBox.button(QtWidgets.QDialogButtonBox.Save).clicked.connect(lambda: self.done(1))
         self.function_type.buttonClicked.connect(self.function_selected)
         self.get_text_widget.threshold_hs.valueChanged.connect(self.show_filter)
+        self.get_text_widget.auto_threshold_bt.clicked.connect(self.tune_text_press)
+        self.match_img_widget.auto_threshold_bt.clicked.connect(self.tune_match_press)
         self.match_img_widget.match_threshold_hs.valueChanged.connect(
             lambda: self.match_img_widget.threshold_lb.setText(
                 "Match threshold : {} % ".format(self.match_img_widget.match_threshold_hs.value())
             )
         )
+        self.has_changed_widget.tolerance_hs.valueChanged.connect(
+            lambda: self.has_changed_widget.tolerance_lb.setText(
+                "Change tolerance : {} % ".format(self.has_changed_widget.tolerance_hs.value())
+            )
+        )
         self.box = box
-        self.folder = folder
+        self.recording = recording
+        self.folder = recording.folder
         self.match = None
         self.curren_view = current_view
 
@@ -36,19 +43,26 @@ class FunctionDialog(QtWidgets.QDialog):
 
         self.additional_bl.addWidget(self.get_text_widget)
         self.additional_bl.addWidget(self.match_img_widget)
+        self.additional_bl.addWidget(self.has_changed_widget)
         self.get_text_widget.hide()
         self.match_img_widget.hide()
+        self.has_changed_widget.hide()
         if function:
             self.name_le.setText(function.name)
             if "image" in function.dictionary:
                 self.match = function.dictionary["image"]
                 self.match_img_widget.match_img_le.setText(self.match)
                 self.match_img_widget.match_threshold_hs.setValue(function.dictionary["match_threshold"])
+                self.match_img_widget.rotate_chb.setChecked(function.dictionary.get("rotate", False))
+                self.match_img_widget.pyramid_levels_sb.setValue(function.dictionary.get("pyramid_levels", 0))
             elif "threshold" in function.dictionary:
                 self.get_text_widget.threshold_hs.setValue(function.dictionary["threshold"])
+            elif "tolerance" in function.dictionary:
+                self.has_changed_widget.tolerance_hs.setValue(function.dictionary["tolerance"])
 
-            exec("self.{}_rb.setChecked(True)\n"
-                 "self.function_selected(self.{}_rb)".format(function.type, function.type))
+            button = getattr(self, "changed_rb" if function.type == "change" else function.type + "_rb")
+            button.setChecked(True)
+            self.function_selected(button)
 
     def get_function(self):
         text = self.get_radio_button()
@@ -63,7 +77,8 @@ class FunctionDialog(QtWidgets.QDialog):
                 {
                     "image": self.match,
                     "match_threshold": self.match_img_widget.match_threshold_hs.value(),
-                    "rotate": self.match_img_widget.rotate_chb.isChecked()
+                    "rotate": self.match_img_widget.rotate_chb.isChecked(),
+                    "pyramid_levels": self.match_img_widget.pyramid_levels_sb.value()
                 }
                 )
         elif text == "Click()":
@@ -77,7 +92,10 @@ class FunctionDialog(QtWidgets.QDialog):
                 self.name_le.text().replace(" ", "_"), "string", self.box, {"threshold": threshold_value}
             )
         elif text == "Has changed(bool)":
-            box_function = BoxFunction(self.name_le.text().replace(" ", "_"), "change", self.box)
+            box_function = BoxFunction(
+                self.name_le.text().replace(" ", "_"), "change", self.box,
+                {"tolerance": self.has_changed_widget.tolerance_hs.value()}
+            )
         elif text == "Game box([x, y, width, height])":
             box_function = BoxFunction(self.name_le.text().replace(" ", "_"), "game_box", self.box)
 
@@ -97,18 +115,54 @@ class FunctionDialog(QtWidgets.QDialog):
     def show_filter(self):
         threshold = self.get_text_widget.threshold_hs.value()
         print(threshold)
-        exec("cropped = Image.open('{}').crop([{}, {}, {}, {}])\n"
-             "im = cropped.filter(ImageFilter.EDGE_ENHANCE_MORE)\n"
-             "npcropped = numpy.array(im)[:, :, ::-1].copy()\n"
-             "npcropped = cv2.resize(npcropped, (0,0), fx=3, fy=3)\n"
-             "im = Image.fromarray(npcropped)\n"
-             "im = im.convert('L')\n"
-             "im = im.point(lambda x: 0 if x<{} else 255, '1')\n"
-             "self.image_view.setImage(QtGui.QPixmap.fromImage(ImageQt(im)))\n".format(self.curren_view,
-                                int(self.box[0]), int(self.box[1]), int(self.box[0] + self.box[2]),
-                                int(self.box[1] + self.box[3]),
-                                threshold)
-             )
+        frame = self.recording.frame(self.curren_view)
+        cropped = frame[int(self.box[1]):int(self.box[1] + self.box[3]), int(self.box[0]):int(self.box[0] + self.box[2])]
+        im = binarize(cropped, threshold)
+        image = QtGui.QImage(im.data, im.shape[1], im.shape[0], im.strides[0], QtGui.QImage.Format_Grayscale8)
+        self.image_view.setImage(QtGui.QPixmap.fromImage(image))
+
+    def sample_frames(self, count):
+        return [self.recording.frame(name) for name in sample(self.recording.names, count)]
+
+    def tune_match_press(self):
+        if not self.match:
+            QMessageBox.about(self, 'Auto tune', 'Select the image to match first')
+            return
+        QtWidgets.QApplication.setOverrideCursor(QtCore.Qt.WaitCursor)
+        try:
+            result = tune_match(self.sample_frames(32), self.box,
+                                load_template(self.match, self.match_img_widget.rotate_chb.isChecked()))
+        except Exception as error:
+            QMessageBox.about(self, 'Auto tune', 'Matching failed: {}'.format(error))
+            return
+        finally:
+            QtWidgets.QApplication.restoreOverrideCursor()
+        if result["threshold"] is None:
+            QMessageBox.about(self, 'Auto tune', 'Matches can not be told apart from the background')
+            return
+        self.match_img_widget.match_threshold_hs.setValue(result["threshold"])
+        QMessageBox.about(self, 'Auto tune', 'Match threshold set to {} %, {} matches and {} misses on sampled frames'.format(
+            result["threshold"], result["hits"], result["misses"]
+        ))
+
+    def tune_text_press(self):
+        kind = "number" if self.get_radio_button() == "Get number(float)" else "string"
+        QtWidgets.QApplication.setOverrideCursor(QtCore.Qt.WaitCursor)
+        try:
+            result = tune_text(ocr_tool(), self.sample_frames(8), self.box, kind)
+        except Exception as error:
+            QMessageBox.about(self, 'Auto tune', 'OCR failed: {}'.format(error))
+            return
+        finally:
+            QtWidgets.QApplication.restoreOverrideCursor()
+        if result["threshold"] is None:
+            QMessageBox.about(self, 'Auto tune', 'No text was recognized at any threshold')
+            return
+        self.get_text_widget.filter_chb.setChecked(True)
+        self.get_text_widget.threshold_hs.setValue(result["threshold"])
+        QMessageBox.about(self, 'Auto tune', 'Threshold set to {}, read {} with {} OCR calls'.format(
+            result["threshold"], ", ".join(str(text) for text in result["texts"]), result["calls"]
+        ))
 
     def get_radio_button(self):
         return self.function_type.checkedButton().text()
@@ -116,6 +170,7 @@ class FunctionDialog(QtWidgets.QDialog):
     def function_selected(self, btn):
         self.get_text_widget.hide()
         self.match_img_widget.hide()
+        self.has_changed_widget.hide()
         self.buttonBox.button(QtWidgets.QDialogButtonBox.Save).setEnabled(True)
         text = btn.text()
         if text == "Match img([] of x, y)":
@@ -132,6 +187,7 @@ class FunctionDialog(QtWidgets.QDialog):
             self.get_text_widget.show()
         elif text == "Has changed(bool)":
             self.description_lb.setText("Checks if image in box differs from last call of this function.")
+            self.has_changed_widget.show()
         elif text == "Click()":
             self.description_lb.setText("Clicks in middle of selected box.")
         elif text == "Game box([x, y, width, height])":
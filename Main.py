@@ -31,6 +31,11 @@ class MainWindow(QtWidgets.QMainWindow):
         self.mapper_screen.clicked_cancel.connect(lambda: self.central_widget.setCurrentWidget(self.start_screen))
         self.record_screen.clicked_cancel.connect(lambda: self.central_widget.setCurrentWidget(self.start_screen))
 
+    def closeEvent(self, event):
+        self.record_screen.stop_recording(wait=True)
+        self.mapper_screen.flush_lib()
+        super(MainWindow, self).closeEvent(event)
+
     def open_mapper(self):
         file = str(QtWidgets.QFileDialog.getExistingDirectory(self, "Select Directory with your screen recording"))
         directory, _ = QtWidgets.QFileDialog.getSaveFileName(
@@ -10,3 +10,10 @@ class BoxFunction(object):
         if self.type == "position":
             if 'image' not in self.dictionary.keys():
                 raise ValueError('{} needs to have an image to work properly'.format(self.name))
+
+    def to_dict(self):
+        return {"name": self.name, "type": self.type, "box": self.box, "dictionary": self.dictionary}
+
+    @staticmethod
+    def from_dict(data):
+        return BoxFunction(data["name"], data["type"], data["box"], data["dictionary"])
@@ -0,0 +1,140 @@
+import os
+import cv2
+import zlib
+import threading
+import numpy
+
+from Models.Runtime import FrameStore, STORE_INDEX, STORE_SEGMENT, STORE_RAW, STORE_ZLIB, STORE_INDEX_DTYPE
+
+
+class FrameStoreWriter(object):
+    """Appends BGRA frames to a frame store (see Runtime.FrameStore for the layout).
+
+    Frames may arrive out of order from several encoder threads, they are buffered
+    until they can be appended in frame order so that frame n is always record n of the index.
+    A frame that could not be written, and references to it, get an empty record (length 0)
+    and put raises the error.
+    """
+
+    def __init__(self, folder, compression=STORE_RAW, segment_size=256 * 1024 * 1024):
+
+        self.folder = folder
+        self.compression = compression
+        self.segment_size = segment_size
+        self.bytes_written = 0
+
+        self._segment = -1
+        self._segment_file = None
+        self._offset = 0
+        self._next = 0
+        self._pending = {}
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._index_file = open(os.path.join(folder, STORE_INDEX), 'wb')
+
+    def encode(self, raw):
+        if self.compression == STORE_ZLIB:
+            return zlib.compress(raw, 1)
+        return raw
+
+    def put(self, number, data, width, height, ref=-1):
+        with self._lock:
+            self._pending[number] = (data, width, height, ref)
+            while self._next in self._pending:
+                number, self._next = self._next, self._next + 1
+                self._append(number, *self._pending.pop(number))
+
+    def put_reference(self, number, original):
+        self.put(number, None, 0, 0, original)
+
+    def close(self):
+        """Appends the frames still pending and closes the files.
+
+        Frames that never arrived get an empty record, so frame n stays record n of the index.
+        """
+        error = None
+        with self._lock:
+            try:
+                for number in range(self._next, max(self._pending, default=-1) + 1):
+                    try:
+                        if number in self._pending:
+                            self._append(number, *self._pending.pop(number))
+                        else:
+                            self._append_empty()
+                    except Exception as exception:
+                        error = error or exception
+            finally:
+                self._index_file.close()
+                if self._segment_file:
+                    self._segment_file.close()
+        if error is not None:
+            raise error
+
+    def _append(self, number, data, width, height, ref):
+        if ref >= 0:
+            if ref not in self._entries:
+                # The original was never written
+                self._append_empty(ref)
+                return
+            entry = self._entries[ref].copy()
+            entry['ref'] = ref
+            self._index_file.write(entry.tobytes())
+            return
+
+        try:
+            if self._segment_file is None or self._offset + len(data) > self.segment_size:
+                if self._segment_file:
+                    self._segment_file.close()
+                self._segment += 1
+                self._segment_file = open(os.path.join(self.folder, STORE_SEGMENT.format(self._segment)), 'wb')
+                self._offset = 0
+
+            self._segment_file.write(data)
+        except Exception:
+            # A partial write leaves the segment in an unknown state, the next frame starts a new one
+            if self._segment_file:
+                self._segment_file.close()
+                self._segment_file = None
+            self._entries = {}
+            self._append_empty()
+            raise
+        entry = numpy.array([(self._segment, self._offset, len(data), width, height, self.compression, -1)],
+                            dtype=STORE_INDEX_DTYPE)
+        self._index_file.write(entry.tobytes())
+        self._entries = {number: entry}
+        self._offset += len(data)
+        self.bytes_written += len(data)
+
+    def _append_empty(self, ref=-1):
+        entry = numpy.zeros(1, dtype=STORE_INDEX_DTYPE)
+        entry['ref'] = ref
+        self._index_file.write(entry.tobytes())
+
+
+class Recording(object):
+    """Frames of a recording, either a folder of png files or a frame store."""
+
+    def __init__(self, folder):
+
+        self.folder = folder
+        self.store = None
+        if FrameStore.is_store(folder):
+            self.store = FrameStore(folder)
+            self.names = [str(i) for i in range(len(self.store))]
+        else:
+            self.names = sorted([file for file in os.listdir(folder) if file[-4:] == ".png"],
+                                key=lambda name: (len(name), name))
+
+    def __len__(self):
+        return len(self.names)
+
+    def path(self, name):
+        if self.store is None:
+            return self.folder + "/" + name
+        return None
+
+    def frame(self, name):
+        """Returns the frame as a BGR numpy array, like cv2.imread."""
+        if self.store is None:
+            return cv2.imread(self.path(name))
+        return cv2.cvtColor(self.store.frame(int(name)), cv2.COLOR_BGRA2BGR)
@@ -1,10 +1,32 @@
+import io
 import os
 import ast
+import json
+import functools
 
 from Models.BoxFunction import BoxFunction
 
+RUNTIME = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Runtime.py")
+
+
+@functools.lru_cache(maxsize=None)
+def runtime_source():
+    with open(RUNTIME, 'r') as file:
+        source = file.read()
+    return source[source.index('"""', 3) + 3:].lstrip("\n")
+
+
+def manifest_path(destination):
+    """Path of the json manifest written next to a generated library."""
+    return os.path.splitext(destination)[0] + ".json"
+
 
 class Library(object):
+    """A generated library, the python module and a json manifest of its box functions.
+
+    write() keeps the code of every function keyed by its definition, so only functions that
+    were added or changed since the previous write are generated again.
+    """
 
     def __init__(self, destination, screen_box, directory, functions, dict):
 
@@ -13,168 +35,308 @@ class Library(object):
         self.directory = directory
         self.functions = functions
         self.dict = dict
+        self._chunks = {}
+        self._written = None
 
-    @staticmethod
-    def create_library(destination, screen_box, directory, functions, dict):
-        name = os.path.basename(os.path.normpath(destination))[:-3].replace(" ", "_")
-        destination = destination[:-(len(name)+3)]+name+".py"
-        with open(destination, 'w') as file:
-            file.write("import random\n"
-                       "import numpy\n"
-                       "import cv2\n"
-                       "import pyautogui\n"
-                       "import pyocr\n"
-                       "import pyocr.builders\n"
-                       "from PIL import Image, ImageFilter\n"
-                       "from mss import mss\n")
-            file.write("\n\n")
-            file.write("""class {}(object):\n"""
-                       """# c {{'screen_box': {}, 'directory': '{}', 'dict': {}}}\n"""
-                       """\n"""
-                       """    def __init__(self):\n"""
-                       """        self.img = None\n"""
-                       """        tools = pyocr.get_available_tools()\n"""
-                       """        if len(tools) == 0:\n"""
-                       """            print('No OCR tool found')\n"""
-                       """            sys.exit(1)\n"""
-                       """        self.tool = tools[0]\n"""
-                       """        self.screen_box = {}\n"""
-                       """        print("Will use tool '%s'" % (self.tool.get_name()))\n""".format(
-                name, screen_box, directory, dict, screen_box
+    @property
+    def name(self):
+        return os.path.basename(os.path.normpath(self.destination))[:-3].replace(" ", "_")
+
+    @property
+    def path(self):
+        return self.destination[:-(len(self.name) + 3)] + self.name + ".py"
+
+    def write(self):
+        chunks = {}
+        for function in self.functions:
+            key = self.function_key(function)
+            chunks[key] = self._chunks[key] if key in self._chunks else self.function_source(function)
+        self._chunks = chunks
+
+        path = self.path
+        source = self.header_source() + \
+            "".join(chunks[self.function_key(function)] for function in self.functions) + \
+            self.footer_source()
+        manifest = json.dumps(self.manifest(), separators=(',', ':'))
+        if self._written != (path, source, manifest):
+            with open(path, 'w') as file:
+                file.write(source)
+            with open(manifest_path(path), 'w') as file:
+                file.write(manifest)
+            self._written = (path, source, manifest)
+        return path
+
+    def manifest(self):
+        return {
+            "name": self.name,
+            "screen_box": self.screen_box,
+            "directory": self.directory,
+            "dict": self.dict,
+            "functions": [function.to_dict() for function in self.functions],
+        }
+
+    def function_key(self, function):
+        return json.dumps(function.to_dict(), sort_keys=True), bool(self.screen_box)
+
+    def header_source(self):
+        name, screen_box, directory, functions, dict = \
+            self.name, self.screen_box, self.directory, self.functions, self.dict
+        file = io.StringIO()
+        file.write(runtime_source())
+        file.write("\n"
+                   "pyautogui = LazyModule('pyautogui')\n"
+                   "\n\n")
+        file.write("""class {}(object):\n"""
+                   """# c {{'screen_box': {}, 'directory': '{}', 'dict': {}}}\n"""
+                   """\n"""
+                   """    def __init__(self, ocr_processes=0):\n"""
+                   """        self.img = None\n"""
+                   """        self.origin = (0, 0)\n"""
+                   """        self.anchor = None\n"""
+                   """        self.capture = CaptureSession()\n"""
+                   """        self.ocr_cache = LRUCache(256)\n"""
+                   """        self.ocr_pool = OcrProcessPool(ocr_processes) if ocr_processes else None\n"""
+                   """        self.screen_box = {}\n"""
+                   """        self._tool = None\n"""
+                   """        self._templates = None\n""".format(
+            name, screen_box, directory, dict, screen_box
+        ))
+        for function in functions:
+            if function.type == "change":
+                file.write("        self.{}_signature = None\n".format(function.name))
+        file.write("\n"
+                   "    @property\n"
+                   "    def tool(self):\n"
+                   "        if self._tool is None:\n"
+                   "            self._tool = ocr_tool()\n"
+                   "            print(\"Will use tool '%s'\" % (self._tool.get_name()))\n"
+                   "        return self._tool\n"
+                   "\n"
+                   "    def get_tool(self):\n"
+                   "        return self.tool\n"
+                   "\n"
+                   "    @property\n"
+                   "    def templates(self):\n"
+                   "        if self._templates is None:\n"
+                   "            self.load_templates()\n"
+                   "        return self._templates\n"
+                   "\n")
+        if "position_image" in dict and dict["position_image"]:
+            file.write("    @property\n"
+                       "    def position_template(self):\n"
+                       "        if self._templates is None:\n"
+                       "            self.load_templates()\n"
+                       "        return self._position_template\n"
+                       "\n")
+        file.write("    def load_templates(self):\n"
+                   "        self._templates = {\n")
+        for function in functions:
+            if function.type == "position":
+                file.write("            '{}': load_template('{}', {}),\n".format(
+                    function.name, function.dictionary["image"], bool(function.dictionary.get("rotate"))
+                ))
+        file.write("        }\n")
+        if "position_image" in dict and dict["position_image"]:
+            file.write("        self._position_template = load_template('{}/Images/position_img.png')[0]\n".format(
+                directory
             ))
-            for function in functions:
-                if function.type == "change":
-                    file.write("        self.grab_screen()\n"
-                               "        self.{}_img = self.img.crop([{}, {}, {}, {}])\n".format
-                    (
-                        function.name, int(function.box[0]), int(function.box[1]),
-                        int(function.box[0] + function.box[2]), int(function.box[1] + function.box[3])
-                    ))
-            file.write("\n")
-            file.write("    def grab_screen(self):\n"
-                       "        with mss() as sct:\n")
+        file.write("\n")
+        file.write("    def grab_screen(self):\n")
+        if screen_box:
+            file.write("        return self.set_frame(self.capture.grab(self.screen_box))\n")
+        else:
+            file.write("        return self.set_frame(self.capture.grab())\n")
+        file.write("\n"
+                   "    def set_frame(self, img):\n"
+                   "        self.img = frame_view(img)\n"
+                   "        self.origin = (img.left, img.top)\n"
+                   "        if self.screen_box and (img.left, img.top, img.width, img.height) != (\n"
+                   "                self.screen_box['left'], self.screen_box['top'],\n"
+                   "                self.screen_box['width'], self.screen_box['height']):\n"
+                   "            left, top = self.screen_box['left'] - img.left, self.screen_box['top'] - img.top\n"
+                   "            self.img = self.img[top:top + self.screen_box['height'], left:left + self.screen_box['width']]\n"
+                   "            self.origin = (self.screen_box['left'], self.screen_box['top'])\n"
+                   "        return self.img\n"
+                   "\n")
+        file.write("    def grab_file(self, file, index=None):\n"
+                   "        if index is None:\n"
+                   "            self.img = load_frame(file)\n"
+                   "        else:\n"
+                   "            self.img = open_store(file).frame(index)\n"
+                   "        if self.screen_box:\n"
+                   "            self.origin = (self.screen_box['left'], self.screen_box['top'])\n"
+                   "        else:\n"
+                   "            self.origin = (0, 0)\n"
+                   "        return self.img\n"
+                   "\n")
+        file.write("    def ocr(self, image, kind):\n"
+                   "        return self.ocr_cache.get(image_key(kind, image), lambda: recognize(self.get_tool, image, kind, self.ocr_pool))\n"
+                   "\n")
+        file.write("    def write_text(self, text):\n"
+                   "        pyautogui.typewrite(text)\n"
+                   "\n")
+        file.write("    def press_button(self, text):\n"
+                   "        pyautogui.press(text)\n"
+                   "\n")
+        if "position_image" in dict and dict["position_image"]:
+            file.write("    def locate_screen(self):\n"
+                       "        found = locate(self.capture, self.position_template, self.anchor)\n"
+                       "        if found is None:\n"
+                       "            return None\n"
+                       "        self.anchor = found\n"
+                       "        if self.screen_box:\n"
+                       "            self.screen_box['left'] = found[0] - {}\n"
+                       "            self.screen_box['top'] = found[1] - {}\n"
+                       "        return found\n"
+                       "\n".format(dict["position_image"][0], dict["position_image"][1]))
+        return file.getvalue()
+
+    def function_source(self, function):
+        screen_box = self.screen_box
+        file = io.StringIO()
+        arguments = {"position": ", max_results=None", "change": ", fraction=False"}
+        file.write("    def {}(self{}):\n"
+                   "# f BoxFunction('{}', '{}', {}, {})\n".format(
+            function.name, arguments.get(function.type, ""),
+            function.name, function.type, function.box, function.dictionary
+        )
+        )
+        if function.type in ("string", "number"):
+            file.write("        return self.ocr(self._{}_image(), '{}')\n".format(function.name, function.type))
+            file.write("\n"
+                       "    def _{}_image(self):\n".format(function.name))
+        if function.type == "click":
+            x, y = int(function.box[0] + function.box[2] / 2), int(function.box[1] + function.box[3] / 2)
             if screen_box:
-                file.write("            img = sct.grab(self.screen_box)\n")
+                file.write("        pyautogui.click(self.screen_box['left'] + {}, self.screen_box['top'] + {})\n".format(x, y))
             else:
-                file.write("            img = sct.grab(sct.monitors[0])\n")
-            file.write("        self.img = Image.frombytes('RGB', img.size, img.rgb)\n"
-                       "        return self.img\n"
-                       "\n")
-            file.write("    def grab_file(self, file):\n"
-                       "        self.img = Image.open(file)\n"
-                       "\n")
-            file.write("    def write_text(self, text):\n"
-                       "        pyautogui.typewrite(text)\n"
-                       "\n")
-            file.write("    def press_button(self, text):\n"
-                       "        pyautogui.press(text)\n"
+                file.write("        pyautogui.click({}, {})\n".format(x, y))
+        elif function.type == "game_box":
+            file.write("""        return {}\n""".format(function.box))
+        else:
+            file.write("        cropped = self.img[{}:{}, {}:{}]\n".format
+            (
+                int(function.box[1]), int(function.box[1] + function.box[3]),
+                int(function.box[0]), int(function.box[0] + function.box[2])
+            )
+            )
+            if function.type in ("string", "number"):
+                if "threshold" in function.dictionary.keys() and function.dictionary["threshold"]:
+                    file.write("        return Image.fromarray(binarize(cropped, {}))\n".format(
+                        function.dictionary["threshold"]
+                    ))
+                else:
+                    file.write("        return Image.fromarray(cv2.cvtColor(cropped, cv2.COLOR_BGRA2RGB))\n")
+            elif function.type == "position":
+                if "rotate" in function.dictionary and function.dictionary["rotate"]:
+                    file.write("        angle, res = match_variants(cropped, self.templates['{}'], {})\n"
+                               "        image = self.templates['{}'][angle]\n".format(
+                        function.name, function.dictionary.get("pyramid_levels", 0), function.name
+                    ))
+                else:
+                    file.write("        image = self.templates['{}'][0]\n".format(function.name))
+                    if function.dictionary.get("pyramid_levels"):
+                        file.write("        res = match(cropped, image, {})\n".format(
+                            function.dictionary["pyramid_levels"]
+                        ))
+                    else:
+                        file.write("        res = cv2.matchTemplate(cropped, image, cv2.TM_CCOEFF_NORMED)\n")
+                file.write("        threshold = {}\n"
+                           "        found = peaks(res, threshold, image.shape, max_results,"
+                           " (self.origin[0] + {}, self.origin[1] + {}))\n".format(
+                    function.dictionary["match_threshold"] / 100., int(function.box[0]), int(function.box[1])
+                ))
+                if "rotate" in function.dictionary and function.dictionary["rotate"]:
+                    file.write("        return found, angle\n\n")
+                else:
+                    file.write("        return found\n\n")
+            elif function.type == "change":
+                file.write("        current = signature(cropped)\n"
+                           "        if self.{}_signature is None:\n"
+                           "            self.{}_signature = current\n"
+                           "        changed = changed_fraction(self.{}_signature, current)\n"
+                           "        if changed > {}:\n"
+                           "            self.{}_signature = current\n"
+                           "        return changed if fraction else changed > {}\n".format(
+                    function.name, function.name, function.name,
+                    function.dictionary.get("tolerance", 0) / 100., function.name,
+                    function.dictionary.get("tolerance", 0) / 100.
+                ))
+        file.write("\n")
+        return file.getvalue()
+
+    def footer_source(self):
+        name, functions, dict = self.name, self.functions, self.dict
+        file = io.StringIO()
+        ocr_functions = [function for function in functions if function.type in ("string", "number")]
+        if ocr_functions:
+            file.write("    def read_text_all(self):\n"
+                       "        return read_text_cached(self.get_tool, self.ocr_cache, [\n")
+            for function in ocr_functions:
+                file.write("            ('{}', '{}', self._{}_image()),\n".format(
+                    function.name, function.type, function.name
+                ))
+            file.write("        ], self.ocr_pool)\n"
                        "\n")
-            if "position_image" in dict and dict["position_image"]:
-                file.write("    def locate_screen(self):\n"
-                           "        image = cv2.imread('{}/Images/position_img.png')\n"
-                           "        with mss() as sct:\n"
-                           "            screen = sct.grab(sct.monitors[0])\n"
-                           "        screen = Image.frombytes('RGB', screen.size, screen.rgb)\n"
-                           "        cropped = numpy.array(screen)[:, :, ::-1].copy()\n"
-                           "        res = cv2.matchTemplate(cropped, image, cv2.TM_CCOEFF_NORMED)\n"
-                           "        loc = numpy.where( res >= 0.8)\n"
-                           "        if len(loc[0])>0:\n"
-                           "            self.screen_box['left']=loc[0][0]+{}\n"
-                           "            self.screen_box['left']=loc[1][0]+{}\n"
-                           "\n".format(directory, dict["position_image"][0], dict["position_image"][1]))
 
-            for function in functions:
-                file.write("    def {}(self):\n"
-                           "# f BoxFunction('{}', '{}', {}, {})\n".format(
-                    function.name,
-                    function.name, function.type, function.box, function.dictionary
-                )
-                )
-                if function.type == "click":
-                    file.write(
-                        """        pyautogui.click({}, {})\n""".format((int(screen_box["left"] + function.box[0] + function.box[2] / 2)),
-                                                                       int(screen_box["top"] + function.box[1] + function.box[3] / 2)))
-                elif function.type == "game_box":
-                    file.write("""        return {}\n""".format(function.box))
-                else:
-                    file.write("        cropped = self.img.crop([{}, {}, {}, {}])\n".format
-                    (
-                        int(function.box[0]), int(function.box[1]), int(function.box[0] + function.box[2]),
-                        int(function.box[1] + function.box[3])
-                    )
-                    )
-                    if "threshold" in function.dictionary.keys() and function.dictionary["threshold"]:
-                        file.write("        im = cropped.filter(ImageFilter.EDGE_ENHANCE_MORE)\n"
-                                   "        npcropped = numpy.array(im)[:, :, ::-1].copy()\n"
-                                   "        npcropped = cv2.resize(npcropped, (0,0), fx=3, fy=3)\n"
-                                   "        im = Image.fromarray(npcropped)\n"
-                                   "        im = im.convert('L')\n"
-                                   "        cropped = im.point(lambda x: 0 if x<{} else 255, '1')\n".format(function.dictionary["threshold"]))
-                    if function.type == "string":
-                        file.write("""        return self.tool.image_to_string(cropped, lang="eng", builder=pyocr.builders.TextBuilder())\n""")
-                    elif function.type == "number":
-                        file.write("""        return float(self.tool.image_to_string(cropped, lang="eng", builder=pyocr.builders.DigitBuilder()))\n""")
-                    elif function.type == "position":
-                        file.write("        image = cv2.imread('{}')\n"
-                                   "        cropped = numpy.array(cropped)[:, :, ::-1].copy()\n"
-                                   "        res = cv2.matchTemplate(cropped, image, cv2.TM_CCOEFF_NORMED)\n"
-                                   "        threshold = 0.{}\n"
-                                   "        loc = numpy.where( res >= threshold)\n".format(
-                            function.dictionary["image"], function.dictionary["match_threshold"]
-                            )
-                        )
-                        if "rotate" in function.dictionary and function.dictionary["rotate"]:
-                            file.write("        for angle in [90, 180, 270]:\n"
-                                       "            if len(loc[0])>0:\n"
-                                       "                break\n"
-                                       "            image = numpy.array(Image.open('{}').rotate(angle).convert('RGB'))[:, :, ::-1].copy()\n"
-                                       "            res = cv2.matchTemplate(cropped, image, cv2.TM_CCOEFF_NORMED)\n"
-                                       "            threshold = 0.{}\n"
-                                       "            loc = numpy.where( res >= threshold)\n".format(
-                                function.dictionary["image"], function.dictionary["match_threshold"]
-                            )
-                            )
-                        file.write("        return loc\n\n")
-                    elif function.type == "change":
-                        file.write("        if self.{}_img == cropped:\n"
-                                   "            return False\n"
-                                   "        else:\n"
-                                   "            self.{}_img = cropped\n"
-                                   "            return True\n".format(function.name, function.name))
-                file.write("\n")
-
-            file.write("\n")
-
-            file.write("")
+        file.write("    def snapshot(self, grab=None):\n"
+                   "        return take_snapshot(grab or self.grab_screen, {\n")
+        for function in functions:
+            if function.type != "click":
+                file.write("            '{}': self.{},\n".format(function.name, function.name))
+        file.write("        })\n"
+                   "\n")
 
+        file.write("    def watch(self, on_change, rate=10):\n"
+                   "        return BoxWatcher(self.grab_screen, {\n")
+        for function in functions:
+            if function.type not in ("click", "game_box"):
+                file.write("            '{}': (self.{}, {}),\n".format(function.name, function.name, function.box))
+        file.write("        }, on_change, rate).start()\n"
+                   "\n")
 
-    @staticmethod
-    def load_library(destination):
-        directory = None
-        functions = []
-        with open(destination, 'r') as file:
-            lines = file.readlines()
-            i = 3
-            while i < len(lines):
-                print("line number {} has this text: {}".format(i, lines[i]))
-
-                if len(lines[i])<4:
-                    i += 1
-                    continue
-                else:
-                    if lines[i][:3] == "# c":
-                        class_data = ast.literal_eval(lines[i][4:])
-                        directory = class_data["directory"]
-                        dictionary = class_data["dict"]
-                        print("Directory is {} . and we increased curent line to {}".format(directory, i))
-                        i += 8
-                    elif lines[i][:3] == "# f":
-                        functions.append(eval(lines[i][4:]))
-                        i += 2
-                i += 1
+        if dict.get("async_api"):
+            file.write("\n"
+                       "class {}Async(AsyncLibrary):\n"
+                       "\n"
+                       "    def __init__(self, capture_loop=None, library=None):\n"
+                       "        AsyncLibrary.__init__(self, library or {}(), capture_loop)\n"
+                       "\n".format(name, name))
+            for function in functions:
+                file.write("    async def {}(self, *args, **kwargs):\n"
+                           "        return await self.run(self.library.{}, *args, **kwargs)\n"
+                           "\n".format(function.name, function.name))
+            if ocr_functions:
+                file.write("    async def read_text_all(self):\n"
+                           "        return await self.run(self.library.read_text_all)\n"
+                           "\n")
 
-        return directory, functions, dictionary
+        file.write("\n")
+        return file.getvalue()
 
+    @staticmethod
+    def create_library(destination, screen_box, directory, functions, dict):
+        return Library(destination, screen_box, directory, functions, dict).write()
 
+    @staticmethod
+    def load_library(destination):
+        """Returns (directory, functions, dict) of a library, read from its manifest.
 
+        Libraries written before manifests existed are parsed from the comments of the module.
+        """
+        manifest = manifest_path(destination)
+        if os.path.isfile(manifest):
+            with open(manifest, 'r') as file:
+                data = json.load(file)
+            return data["directory"], [BoxFunction.from_dict(function) for function in data["functions"]], data["dict"]
 
+        directory, functions, dictionary = None, [], {}
+        with open(destination, 'r') as file:
+            for line in file:
+                if line[:3] == "# c":
+                    class_data = ast.literal_eval(line[4:])
+                    directory = class_data["directory"]
+                    dictionary = class_data["dict"]
+                elif line[:3] == "# f":
+                    functions.append(BoxFunction(*ast.literal_eval(line[4 + len("BoxFunction"):])))
+        return directory, functions, dictionary
@@ -0,0 +1,78 @@
+import time
+import importlib.util
+
+
+class LibraryHost(object):
+    """Keeps a generated library loaded to run its functions from the mapper.
+
+    The module is loaded from its file without touching sys.path and one instance is kept
+    together with the frame it decoded last and its OCR tool. When a function definition
+    changes only that function is compiled and swapped into the class. The module is loaded
+    again only when the rest of the class changed, e.g. the screen box or the function list.
+    """
+
+    def __init__(self):
+
+        self.module = None
+        self.library = None
+        self.frame = None
+        self._path = None
+        self._header = None
+        self._keys = {}
+
+    def run(self, writer, function, recording, name):
+        """Runs function on frame name of recording, returns (result, seconds)."""
+        self.sync(writer)
+        self.show(recording, name)
+        start = time.perf_counter()
+        result = getattr(self.library, function.name)()
+        return result, time.perf_counter() - start
+
+    def sync(self, writer):
+        header = writer.header_source()
+        if self.library is None or writer.path != self._path or header != self._header:
+            self.load(writer, header)
+            return
+        for function in writer.functions:
+            key = writer.function_key(function)
+            if self._keys.get(function.name) != key:
+                self.swap(writer, function)
+                self._keys[function.name] = key
+
+    def load(self, writer, header):
+        spec = importlib.util.spec_from_file_location(writer.name, writer.path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        library = getattr(module, writer.name)()
+        if self.library is not None:
+            library._tool = self.library._tool
+            library.ocr_cache = self.library.ocr_cache
+        self.module, self.library = module, library
+        self.frame = None
+        self._path, self._header = writer.path, header
+        self._keys = {function.name: writer.function_key(function) for function in writer.functions}
+
+    def swap(self, writer, function):
+        # The generated methods are class body code with comments at column 0, so they are
+        # compiled inside a throwaway class instead of being dedented.
+        namespace = {}
+        exec(compile("class Chunk(object):\n" + writer.function_source(function), writer.path, 'exec'),
+             self.module.__dict__, namespace)
+        for attribute, value in vars(namespace['Chunk']).items():
+            if callable(value):
+                setattr(type(self.library), attribute, value)
+        if function.type == "position":
+            self.library.templates[function.name] = self.module.load_template(
+                function.dictionary["image"], bool(function.dictionary.get("rotate"))
+            )
+
+    def show(self, recording, name):
+        """Decodes frame name of recording into the library, unless it is already there."""
+        if self.frame == (recording.folder, name):
+            return
+        path = recording.path(name)
+        if path:
+            self.library.grab_file(path)
+        else:
+            self.library.grab_file(recording.folder, int(name))
+        self.frame = (recording.folder, name)
@@ -0,0 +1,239 @@
+import os
+import csv
+import time
+import queue
+import threading
+import mss
+import mss.tools
+import numpy
+
+from Models.FrameStore import FrameStoreWriter
+from Models.Runtime import STORE_RAW, frame_view, signature
+
+DEDUPE_BLOCK = 8
+
+
+class Recorder(object):
+    """Records the screen into a folder of numbered png files, or into a frame store.
+
+    Capturing and encoding are split: run() only grabs raw frames into a bounded
+    queue, a pool of encoder threads compresses and writes them. When the encoders
+    fall behind the queue fills up and new frames are dropped instead of slowing
+    down the capture loop.
+
+    Frames are scheduled on absolute deadlines, so time spent grabbing does not add
+    up to the interval. Deadlines that were already missed are skipped. Capture
+    timestamps and grab/encode durations of every frame are written to frames.csv.
+
+    With dedupe enabled a frame equal to the last stored one is not encoded at all, it is
+    recorded as a reference to that frame. A tolerance > 0 compares signatures instead, grayscale
+    thumbnails averaged over DEDUPE_BLOCK x DEDUPE_BLOCK pixel blocks, so frames whose block
+    averages differ by at most tolerance count as equal.
+
+    run() blocks until stop() is called and owns its own mss session, so it can be run on
+    any thread. If a callback is given it is called from the capture loop with stats()
+    every report_interval seconds, and once more when the recording is finished.
+
+    A failing grab or write stops the recording. The encoders keep draining the queue, the
+    frames recorded so far and frames.csv are still written and the first error is kept in
+    error and reported in stats().
+    """
+
+    def __init__(self, folder, speed, box=0, queue_size=32, encoders=None, store=False, compression=STORE_RAW,
+                 dedupe=True, tolerance=0):
+
+        self.folder = folder
+        self.interval = 1. / speed
+        self.box = box
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.encoders = encoders or max(1, (os.cpu_count() or 2) - 1)
+        self.writer = FrameStoreWriter(folder, compression) if store else None
+        self.dedupe = dedupe
+        self.tolerance = tolerance
+
+        self.running = True
+        self.captured = 0
+        self.written = 0
+        self.dropped = 0
+        self.skipped = 0
+        self.deduplicated = 0
+        self.failed = 0
+        self.bytes_written = 0
+        self.live_fps = 0.
+        self.frames = []
+        self.started = None
+        self.finished = None
+        self.error = None
+        self._lock = threading.Lock()
+        self._original = None
+        self._reference = None
+
+    def run(self, callback=None, report_interval=0.5):
+        workers = [threading.Thread(target=self._encode, daemon=True) for _ in range(self.encoders)]
+        for worker in workers:
+            worker.start()
+
+        try:
+            self._capture(callback, report_interval)
+        except Exception as error:
+            self._fail(error)
+        finally:
+            self.finished = time.time()
+            self._stop_encoders(workers)
+            for finish in (self._close_writer, self.write_metadata, self._write_box):
+                try:
+                    finish()
+                except Exception as error:
+                    self._fail(error)
+            if callback:
+                callback(self.stats())
+
+    def _capture(self, callback, report_interval):
+        with mss.mss() as sct:
+            region = self.box if isinstance(self.box, dict) else sct.monitors[0]
+            self.started = time.time()
+            deadline = time.perf_counter()
+            report_time, report_count = deadline, 0
+            while self.running:
+                timestamp = time.time()
+                grab_start = time.perf_counter()
+                sct_img = sct.grab(region)
+                grab_time = time.perf_counter() - grab_start
+                reference = self._signature(sct_img) if self.dedupe else None
+                if self.dedupe and self._is_duplicate(reference):
+                    self._add_duplicate(self.captured, sct_img, timestamp, grab_time)
+                    self.captured += 1
+                else:
+                    try:
+                        self.queue.put_nowait((self.captured, sct_img, timestamp, grab_time))
+                        self._original = self.captured
+                        self._reference = reference
+                        self.captured += 1
+                    except queue.Full:
+                        self.dropped += 1
+
+                deadline += self.interval
+                now = time.perf_counter()
+                if callback and now - report_time >= report_interval:
+                    self.live_fps = (self.captured - report_count) / (now - report_time)
+                    report_time, report_count = now, self.captured
+                    callback(self.stats())
+                if now > deadline:
+                    missed = int((now - deadline) / self.interval) + 1
+                    self.skipped += missed
+                    deadline += missed * self.interval
+                time.sleep(deadline - now)
+
+    def _stop_encoders(self, workers):
+        # The queue may be full, sentinels are only waited for while an encoder is there to take them.
+        for _ in workers:
+            while True:
+                try:
+                    self.queue.put(None, timeout=0.1)
+                    break
+                except queue.Full:
+                    if not any(worker.is_alive() for worker in workers):
+                        break
+        for worker in workers:
+            worker.join()
+        while True:
+            try:
+                if self.queue.get_nowait() is not None:
+                    self.dropped += 1
+            except queue.Empty:
+                break
+
+    def _close_writer(self):
+        if self.writer:
+            self.writer.close()
+
+    def _write_box(self):
+        if isinstance(self.box, dict):
+            with open(self.folder + "/box.txt", 'w') as file:
+                file.write("{}\n".format(self.box))
+
+    def _fail(self, error):
+        with self._lock:
+            if self.error is None:
+                self.error = repr(error)
+        self.running = False
+
+    def stop(self):
+        self.running = False
+
+    @property
+    def fps(self):
+        if not self.started:
+            return 0.
+        elapsed = (self.finished or time.time()) - self.started
+        return self.captured / elapsed if elapsed > 0 else 0.
+
+    def stats(self):
+        return {
+            "captured": self.captured,
+            "written": self.written,
+            "deduplicated": self.deduplicated,
+            "dropped": self.dropped,
+            "skipped": self.skipped,
+            "failed": self.failed,
+            "queue": self.queue.qsize(),
+            "bytes": self.writer.bytes_written if self.writer else self.bytes_written,
+            "fps": self.live_fps if self.running else self.fps,
+            "error": self.error,
+        }
+
+    def write_metadata(self):
+        with open(self.folder + "/frames.csv", 'w', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(["frame", "timestamp", "grab_ms", "encode_ms", "duplicate_of"])
+            for counter, timestamp, grab_time, encode_time, original in sorted(self.frames):
+                writer.writerow([counter, "{:.6f}".format(timestamp),
+                                 "{:.3f}".format(grab_time * 1000), "{:.3f}".format(encode_time * 1000),
+                                 "" if original is None else original])
+
+    def _signature(self, sct_img):
+        if not self.tolerance:
+            return sct_img.raw
+        size = (-(-sct_img.width // DEDUPE_BLOCK), -(-sct_img.height // DEDUPE_BLOCK))
+        return signature(frame_view(sct_img), size=size)
+
+    def _is_duplicate(self, reference):
+        if self._reference is None:
+            return False
+        if not self.tolerance:
+            return reference == self._reference
+        return reference.shape == self._reference.shape and \
+            numpy.abs(reference - self._reference).max() <= self.tolerance
+
+    def _add_duplicate(self, counter, sct_img, timestamp, grab_time):
+        if self.writer:
+            self.writer.put_reference(counter, self._original)
+        with self._lock:
+            self.deduplicated += 1
+            self.frames.append((counter, timestamp, grab_time, 0., self._original))
+
+    def _encode(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            counter, sct_img, timestamp, grab_time = item
+            encode_start = time.perf_counter()
+            try:
+                if self.writer:
+                    self.writer.put(counter, self.writer.encode(sct_img.raw), sct_img.width, sct_img.height)
+                else:
+                    png = mss.tools.to_png(sct_img.rgb, sct_img.size)
+                    with open(self.folder + "/" + str(counter) + ".png", 'wb') as file:
+                        file.write(png)
+            except Exception as error:
+                with self._lock:
+                    self.failed += 1
+                self._fail(error)
+                continue
+            encode_time = time.perf_counter() - encode_start
+            with self._lock:
+                self.written += 1
+                if not self.writer:
+                    self.bytes_written += len(png)
+                self.frames.append((counter, timestamp, grab_time, encode_time, None))
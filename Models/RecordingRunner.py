@@ -0,0 +1,99 @@
+import os
+import csv
+import time
+import importlib.util
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from Models.FrameStore import Recording
+
+_library = None
+_recording = None
+
+
+def _init_worker(path, name, folder):
+    global _library, _recording
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    _library = getattr(module, name)()
+    _recording = Recording(folder)
+
+
+def _run_frames(function, names):
+    rows = []
+    for name in names:
+        value, error, decode_time, call_time = None, "", 0., 0.
+        start = time.perf_counter()
+        try:
+            path = _recording.path(name)
+            if path:
+                _library.grab_file(path)
+            else:
+                _library.grab_file(_recording.folder, int(name))
+            decode_time = time.perf_counter() - start
+            start = time.perf_counter()
+            value = getattr(_library, function)()
+            call_time = time.perf_counter() - start
+        except Exception as exception:
+            error = repr(exception)
+        rows.append((name, value, decode_time, call_time, error))
+    return rows
+
+
+class RecordingRunner(object):
+    """Evaluates one function of a generated library on every frame of a recording.
+
+    The frames are split into chunks of chunk_size and evaluated on a pool of worker processes,
+    each of which loads the library once. run() blocks until all frames are done or stop() is
+    called, if a callback is given it is called with the rows of every chunk as soon as the
+    chunk is done, so rows arrive out of frame order. A row is (frame, value, decode seconds,
+    call seconds, error).
+
+    Workers are started with spawn, they must not inherit the Qt state of the mapper.
+    """
+
+    def __init__(self, library, name, folder, function, processes=None, chunk_size=32):
+
+        self.library = library
+        self.name = name
+        self.folder = folder
+        self.function = function
+        self.processes = processes or os.cpu_count() or 2
+        self.chunk_size = chunk_size
+        self.names = Recording(folder).names
+
+        self.running = True
+        self.rows = []
+
+    def __len__(self):
+        return len(self.names)
+
+    def run(self, callback=None):
+        chunks = [self.names[i:i + self.chunk_size] for i in range(0, len(self.names), self.chunk_size)]
+        pool = ProcessPoolExecutor(self.processes, mp_context=multiprocessing.get_context("spawn"),
+                                   initializer=_init_worker, initargs=(self.library, self.name, self.folder))
+        try:
+            futures = [pool.submit(_run_frames, self.function, chunk) for chunk in chunks]
+            for future in as_completed(futures):
+                if not self.running:
+                    break
+                rows = future.result()
+                self.rows.extend(rows)
+                if callback:
+                    callback(rows)
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+        return self.rows
+
+    def stop(self):
+        self.running = False
+
+    def write_csv(self, path):
+        order = {name: i for i, name in enumerate(self.names)}
+        with open(path, 'w', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(["frame", "value", "decode_ms", "call_ms", "error"])
+            for name, value, decode_time, call_time, error in sorted(self.rows, key=lambda row: order[row[0]]):
+                writer.writerow([name, "" if value is None else value,
+                                 "{:.3f}".format(decode_time * 1000), "{:.3f}".format(call_time * 1000), error])
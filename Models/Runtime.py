@@ -0,0 +1,750 @@
+"""Helpers used by generated libraries.
+
+The source of this module is copied into every library written by Library.create_library,
+so generated libraries stay standalone. Keep it free of imports from the rest of Botter.
+"""
+import os
+import mmap
+import zlib
+import importlib
+import threading
+from collections import OrderedDict
+import time
+import functools
+
+
+class LazyModule(object):
+    """Stands in for a module until one of its attributes is used.
+
+    The first attribute access imports the module (and the given submodules) and puts it in
+    place of the placeholder in the globals of this module, so importing a library costs
+    nothing for the backends it does not use.
+    """
+
+    def __init__(self, name, *submodules, alias=None):
+        self._names = (name,) + submodules
+        self._alias = alias or name
+
+    def __getattr__(self, attribute):
+        module = importlib.import_module(self._names[0])
+        for name in self._names[1:]:
+            importlib.import_module(name)
+        globals()[self._alias] = module
+        return getattr(module, attribute)
+
+
+asyncio = LazyModule('asyncio')
+hashlib = LazyModule('hashlib')
+re = LazyModule('re')
+cv2 = LazyModule('cv2')
+numpy = LazyModule('numpy')
+pyocr = LazyModule('pyocr', 'pyocr.builders')
+Image = LazyModule('PIL.Image', alias='Image')
+mss = LazyModule('mss')
+shared_memory = LazyModule('multiprocessing.shared_memory', alias='shared_memory')
+
+
+STORE_INDEX = "frames.idx"
+STORE_SEGMENT = "frames_{:05d}.seg"
+STORE_RAW = 0
+STORE_ZLIB = 1
+STORE_INDEX_DTYPE = [
+    ('segment', '<u4'),
+    ('offset', '<u8'),
+    ('length', '<u4'),
+    ('width', '<u2'),
+    ('height', '<u2'),
+    ('compression', 'u1'),
+    ('ref', '<i4'),
+]
+
+
+class FrameStore(object):
+    """Reads recordings saved as a frame store.
+
+    Frames are BGRA buffers appended to segment files, frames.idx holds one fixed size
+    record per frame with its segment, offset and size. A deduplicated frame points to the
+    bytes of the frame it repeats and ref holds that frame's number (-1 otherwise).
+    Segments are memory-mapped, so frame(i) of an uncompressed store is a read-only numpy
+    view without any copy.
+    """
+
+    def __init__(self, folder):
+        self.folder = folder
+        path = os.path.join(folder, STORE_INDEX)
+        if os.path.getsize(path) >= numpy.dtype(STORE_INDEX_DTYPE).itemsize:
+            self.index = numpy.memmap(path, dtype=STORE_INDEX_DTYPE, mode='r')
+        else:
+            self.index = numpy.zeros(0, dtype=STORE_INDEX_DTYPE)
+        self._segments = {}
+
+    @staticmethod
+    def is_store(folder):
+        return os.path.isfile(os.path.join(folder, STORE_INDEX))
+
+    def __len__(self):
+        return len(self.index)
+
+    def frame(self, i):
+        entry = self.index[i]
+        segment = self._segment(int(entry['segment']))
+        offset, length = int(entry['offset']), int(entry['length'])
+        shape = (int(entry['height']), int(entry['width']), 4)
+        if entry['compression'] == STORE_ZLIB:
+            data = zlib.decompress(memoryview(segment)[offset:offset + length])
+            return numpy.frombuffer(data, dtype=numpy.uint8).reshape(shape)
+        return numpy.frombuffer(segment, dtype=numpy.uint8, count=length, offset=offset).reshape(shape)
+
+    def _segment(self, number):
+        if number not in self._segments:
+            with open(os.path.join(self.folder, STORE_SEGMENT.format(number)), 'rb') as file:
+                self._segments[number] = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._segments[number]
+
+
+_stores = {}
+
+
+def open_store(folder):
+    if folder not in _stores:
+        _stores[folder] = FrameStore(folder)
+    return _stores[folder]
+
+
+class CaptureSession(object):
+    """Long-lived screen capture, one mss instance per thread.
+
+    Opening mss connects to the display server, so it is done once per thread instead of on
+    every grab.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+
+    @property
+    def sct(self):
+        sct = getattr(self._local, 'sct', None)
+        if sct is None:
+            sct = self._local.sct = mss.mss()
+        return sct
+
+    @property
+    def desktop(self):
+        return self.sct.monitors[0]
+
+    def grab(self, region=None):
+        return self.sct.grab(region or self.desktop)
+
+
+def frame_view(shot):
+    """BGRA numpy view of an mss screenshot, without copying its buffer."""
+    return numpy.frombuffer(shot.raw, numpy.uint8).reshape(shot.height, shot.width, 4)
+
+
+def load_frame(path):
+    """Decodes an image file into a BGRA array, the layout of frame_view."""
+    image = cv2.imread(path)
+    if image is None:
+        raise IOError("Can not read image {}".format(path))
+    return cv2.cvtColor(image, cv2.COLOR_BGR2BGRA)
+
+
+def load_template(path, rotate=False):
+    """Decodes a template image and returns {angle: BGRA array}, with 90/180/270 variants if rotate.
+
+    Templates are BGRA like the frames, so crops of a frame are matched without conversion.
+    Alpha is opaque on both sides and does not change TM_CCOEFF_NORMED scores.
+    """
+    image = load_frame(path)
+    templates = {0: image}
+    if rotate:
+        rotations = {90: cv2.ROTATE_90_COUNTERCLOCKWISE, 180: cv2.ROTATE_180, 270: cv2.ROTATE_90_CLOCKWISE}
+        for angle, code in rotations.items():
+            templates[angle] = cv2.rotate(image, code)
+    return templates
+
+
+_executors = {}
+_executors_lock = threading.Lock()
+
+
+def executor(name="match"):
+    """Shared thread pool by name. OpenCV releases the GIL, so matching scales over the threads."""
+    with _executors_lock:
+        if name not in _executors:
+            from concurrent.futures import ThreadPoolExecutor
+            _executors[name] = ThreadPoolExecutor(max_workers=os.cpu_count() or 4, thread_name_prefix=name)
+        return _executors[name]
+
+
+def match(image, template, levels=0, candidates=8):
+    """cv2.matchTemplate with TM_CCOEFF_NORMED, optionally as a coarse-to-fine pyramid search.
+
+    With levels > 0 both images are halved levels times, the best candidates of the coarse
+    match are refined at full resolution and only the windows around them are filled in the
+    returned result, everything else is -1. Levels are capped so the coarse template keeps
+    at least 8 pixels per side.
+    """
+    height, width = template.shape[:2]
+    levels = min(levels, int(numpy.log2(max(min(height, width), 1) / 8.)))
+    if levels <= 0:
+        return cv2.matchTemplate(image, template, cv2.TM_CCOEFF_NORMED)
+
+    small_image, small_template = image, template
+    for _ in range(levels):
+        small_image = cv2.pyrDown(small_image)
+        small_template = cv2.pyrDown(small_template)
+    coarse = cv2.matchTemplate(small_image, small_template, cv2.TM_CCOEFF_NORMED)
+    peaks = numpy.argwhere(coarse == cv2.dilate(coarse, numpy.ones((3, 3), numpy.uint8)))
+    peaks = peaks[numpy.argsort(coarse[peaks[:, 0], peaks[:, 1]])[::-1][:candidates]]
+
+    scale = 2 ** levels
+    result = numpy.full((image.shape[0] - height + 1, image.shape[1] - width + 1), -1, numpy.float32)
+    for y, x in peaks * scale:
+        y0, x0 = max(y - scale, 0), max(x - scale, 0)
+        y1, x1 = min(y + scale + 1, result.shape[0]), min(x + scale + 1, result.shape[1])
+        if y0 >= y1 or x0 >= x1:
+            continue
+        window = cv2.matchTemplate(image[y0:y1 + height - 1, x0:x1 + width - 1], template, cv2.TM_CCOEFF_NORMED)
+        result[y0:y1, x0:x1] = numpy.maximum(result[y0:y1, x0:x1], window)
+    return result
+
+
+def match_variants(image, templates, levels=0):
+    """Matches all template variants ({angle: template}) at the same time.
+
+    Returns (angle, result) of the variant with the best score. Variants larger than the
+    image are skipped, a ValueError is raised when none fits.
+    """
+    height, width = image.shape[:2]
+    variants = [(angle, template) for angle, template in templates.items()
+                if template.shape[0] <= height and template.shape[1] <= width]
+    if not variants:
+        raise ValueError("Box of {}x{} is smaller than every template variant ({})".format(
+            width, height, ", ".join("{}x{}".format(template.shape[1], template.shape[0])
+                                     for template in templates.values())
+        ))
+    if len(variants) == 1:
+        angle, template = variants[0]
+        return angle, match(image, template, levels)
+    futures = [(angle, executor().submit(match, image, template, levels)) for angle, template in variants]
+    results = [(angle, future.result()) for angle, future in futures]
+    return max(results, key=lambda result: result[1].max())
+
+
+def peaks(res, threshold, template_shape, max_results=None, offset=(0, 0)):
+    """Turns a match result into a list of (x, y, score) peaks, best first.
+
+    Only local maxima above threshold are kept. Peaks are walked best first and a peak closer
+    than one template size to a kept one is suppressed, suppressed peaks do not suppress
+    others. x, y are centres of the matched template moved by offset.
+    """
+    height, width = template_shape[:2]
+    dilated = cv2.dilate(res, numpy.ones((height, width), numpy.uint8))
+    ys, xs = numpy.nonzero((res >= threshold) & (res >= dilated))
+    scores = res[ys, xs]
+    order = numpy.argsort(scores)[::-1][:1000]
+    ys, xs, scores = ys[order], xs[order], scores[order]
+
+    close = (numpy.abs(ys[:, None] - ys[None, :]) < height) & (numpy.abs(xs[:, None] - xs[None, :]) < width)
+    suppressed = numpy.zeros(len(scores), bool)
+    for i in range(len(scores)):
+        if not suppressed[i]:
+            suppressed[i + 1:] |= close[i, i + 1:]
+    keep = ~suppressed
+    ys, xs, scores = ys[keep], xs[keep], scores[keep]
+    if max_results is not None:
+        ys, xs, scores = ys[:max_results], xs[:max_results], scores[:max_results]
+    return [(int(x) + width // 2 + offset[0], int(y) + height // 2 + offset[1], float(score))
+            for x, y, score in zip(xs, ys, scores)]
+
+
+def locate(capture, template, last=None, threshold=0.8, margin=64, levels=2):
+    """Finds template on the desktop and returns its top left corner, or None.
+
+    If last (the previous result) is given, a window of margin pixels around it is searched
+    first. Only when the template is not there the whole desktop is searched, downscaled by
+    2^levels and refined around the candidates (see match).
+    """
+    height, width = template.shape[:2]
+    if last is not None:
+        desktop = capture.desktop
+        left, top = max(last[0] - margin, desktop['left']), max(last[1] - margin, desktop['top'])
+        right = min(last[0] + width + margin, desktop['left'] + desktop['width'])
+        bottom = min(last[1] + height + margin, desktop['top'] + desktop['height'])
+        if right - left >= width and bottom - top >= height:
+            shot = capture.grab({'left': left, 'top': top, 'width': right - left, 'height': bottom - top})
+            res = cv2.matchTemplate(frame_view(shot), template, cv2.TM_CCOEFF_NORMED)
+            _, score, _, (x, y) = cv2.minMaxLoc(res)
+            if score >= threshold:
+                return x + left, y + top
+
+    shot = capture.grab()
+    res = match(frame_view(shot), template, levels)
+    _, score, _, (x, y) = cv2.minMaxLoc(res)
+    if score >= threshold:
+        return x + shot.left, y + shot.top
+    return None
+
+
+def ocr_tool():
+    """First available pyocr tool, preferring libtesseract which runs in process over spawning tesseract."""
+    tools = pyocr.get_available_tools()
+    if len(tools) == 0:
+        raise RuntimeError('No OCR tool found')
+    for tool in tools:
+        if getattr(tool, '__name__', '').endswith('libtesseract'):
+            return tool
+    return tools[0]
+
+
+def builder(kind):
+    return pyocr.builders.DigitBuilder() if kind == "number" else pyocr.builders.TextBuilder()
+
+
+def recognize(get_tool, image, kind, pool=None):
+    """OCR of one image, on an OcrProcessPool or in this process with the tool get_tool() returns.
+
+    get_tool is only called without a pool, so the pool never looks up an OCR tool here.
+    Numbers are parsed with parse_number like in read_text_batch, None if they can not be.
+    """
+    if pool is not None:
+        text = pool.image_to_string(image, kind)
+    else:
+        text = get_tool().image_to_string(image, lang="eng", builder=builder(kind))
+    return parse_number(text) if kind == "number" else text
+
+
+def parse_number(text):
+    match = re.search(r'-?\d+(?:\.\d+)?', text.replace(',', '.').replace(' ', ''))
+    return float(match.group()) if match else None
+
+
+def background(image):
+    """Most common value on the border of a grayscale image, 0 or 255 for a binarized one."""
+    border = numpy.concatenate([image[0], image[-1], image[:, 0], image[:, -1]])
+    return int(numpy.bincount(border).argmax())
+
+
+def read_text_batch(tool, items, gap=16):
+    """Recognizes several crops in one OCR call.
+
+    items is a list of (name, kind, image) with kind 'string' or 'number'. The crops are
+    stacked into one image, each padded to the same width and separated by gap pixels of its
+    background value, and every recognized line is assigned to the crop it lies in. Padding
+    with a constant keeps text touching the edge of a crop from being smeared into bars.
+    Returns {name: value}, numbers that can not be parsed are None.
+    """
+    crops = [numpy.asarray(image.convert('L')) for _, _, image in items]
+    width = max(crop.shape[1] for crop in crops) + gap
+    bands, rows, top = [], [], 0
+    for crop in crops:
+        padded = cv2.copyMakeBorder(crop, gap // 2, gap // 2, gap // 2, width - crop.shape[1] - gap // 2,
+                                    cv2.BORDER_CONSTANT, value=background(crop))
+        rows.append(padded)
+        bands.append((top, top + padded.shape[0]))
+        top += padded.shape[0]
+    composite = Image.fromarray(numpy.vstack(rows))
+
+    texts = [[] for _ in items]
+    for line in tool.image_to_string(composite, lang="eng", builder=pyocr.builders.LineBoxBuilder()):
+        (_, y1), (_, y2) = line.position
+        centre = (y1 + y2) / 2.
+        for i, (band_top, band_bottom) in enumerate(bands):
+            if band_top <= centre < band_bottom:
+                texts[i].append(line.content)
+                break
+
+    values = {}
+    for (name, kind, _), text in zip(items, texts):
+        text = " ".join(text).strip()
+        values[name] = parse_number(text) if kind == "number" else text
+    return values
+
+
+class LRUCache(object):
+    """Bounded least recently used cache with hit/miss counters, None values are not stored."""
+
+    MISSING = object()
+
+    def __init__(self, size=256):
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def lookup(self, key):
+        """Value of key, or MISSING. Counts the hit or miss under the lock."""
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return self._items[key]
+            self.misses += 1
+            return self.MISSING
+
+    def get(self, key, compute):
+        value = self.lookup(key)
+        if value is not self.MISSING:
+            return value
+        value = compute()
+        if value is not None:
+            self.put(key, value)
+        return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.size:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.hits = self.misses = 0
+
+
+def image_key(kind, image, path="single"):
+    """Cache key of an OCR input: how it is recognized, its kind and a hash of its pixels.
+
+    path tells the recognition apart, "single" for recognize, "batch" for read_text_batch and
+    "pool" for OcrProcessPool.read_all, as they can read the same pixels differently.
+    """
+    digest = hashlib.blake2b(image.tobytes(), digest_size=16).digest()
+    return path, kind, image.mode, image.size, digest
+
+
+def read_text_cached(get_tool, cache, items, pool=None):
+    """read_text_batch that only recognizes the crops whose pixels are not in cache.
+
+    With an OcrProcessPool the crops are recognized on the pool in parallel instead, like in
+    recognize get_tool is only called without a pool. Values that could not be read (None)
+    are not cached.
+    """
+    path = "batch" if pool is None else "pool"
+    keys = [image_key(kind, image, path) for _, kind, image in items]
+    values, missing = {}, []
+    for key, item in zip(keys, items):
+        value = cache.lookup(key)
+        if value is LRUCache.MISSING:
+            missing.append((key, item))
+        else:
+            values[item[0]] = value
+    if missing:
+        if pool is not None:
+            recognized = pool.read_all([item for _, item in missing])
+        else:
+            recognized = read_text_batch(get_tool(), [item for _, item in missing])
+        for key, item in missing:
+            values[item[0]] = recognized[item[0]]
+            if recognized[item[0]] is not None:
+                cache.put(key, recognized[item[0]])
+    return values
+
+
+EDGE_ENHANCE_MORE = [[-1, -1, -1], [-1, 9, -1], [-1, -1, -1]]
+_threshold_tables = {}
+
+
+def threshold_table(threshold):
+    if threshold not in _threshold_tables:
+        _threshold_tables[threshold] = numpy.where(numpy.arange(256) < threshold, 0, 255).astype(numpy.uint8)
+    return _threshold_tables[threshold]
+
+
+def gray(image, code=None):
+    """Grayscale of a BGR or BGRA image, or of any other layout given the cv2 conversion code."""
+    if code is None and image.ndim == 3:
+        code = cv2.COLOR_BGRA2GRAY if image.shape[2] == 4 else cv2.COLOR_BGR2GRAY
+    return cv2.cvtColor(image, code) if code is not None else image
+
+
+def enhance(image, code=None, scale=3):
+    """The steps of binarize before the threshold: grayscale, EDGE_ENHANCE_MORE and scale up."""
+    image = cv2.filter2D(gray(image, code), -1, numpy.array(EDGE_ENHANCE_MORE, numpy.float32))
+    return cv2.resize(image, None, fx=scale, fy=scale)
+
+
+def binarize(image, threshold, code=None, scale=3):
+    """OCR preprocessing: grayscale, EDGE_ENHANCE_MORE, scale up and threshold.
+
+    Works on a BGR or BGRA numpy image (pass code for other layouts) and returns a uint8
+    image of 0 and 255. Every step is one OpenCV call on a single buffer.
+    """
+    return cv2.LUT(enhance(image, code, scale), threshold_table(threshold))
+
+
+CHANGE_NOISE = 12
+
+
+def signature(image, code=None, size=16):
+    """Area averaged grayscale thumbnail of a BGR or BGRA image, used to detect changes.
+
+    size is the side of a square thumbnail or its (width, height).
+    """
+    if not isinstance(size, tuple):
+        size = (size, size)
+    return cv2.resize(gray(image, code), size, interpolation=cv2.INTER_AREA).astype(numpy.int16)
+
+
+def changed_fraction(previous, current, noise=CHANGE_NOISE):
+    """Fraction of signature cells that differ by more than noise."""
+    return float((numpy.abs(current - previous) > noise).mean())
+
+
+class Snapshot(object):
+    """Results of box functions evaluated on one frame.
+
+    Values are available as attributes (snapshot.gold) or items (snapshot['gold']). timings
+    holds seconds per function, errors the exception of every function that failed (its
+    value is None).
+    """
+
+    def __init__(self, timestamp, grab_time, values, timings, errors):
+        self.timestamp = timestamp
+        self.grab_time = grab_time
+        self.values = values
+        self.timings = timings
+        self.errors = errors
+
+    def __getattr__(self, name):
+        values = self.__dict__.get('values', {})
+        if name in values:
+            return values[name]
+        raise AttributeError(name)
+
+    def __getitem__(self, name):
+        return self.values[name]
+
+    def __repr__(self):
+        return "Snapshot({})".format(", ".join("{}={!r}".format(name, value) for name, value in self.values.items()))
+
+
+def _timed(function):
+    start = time.perf_counter()
+    try:
+        return function(), None, time.perf_counter() - start
+    except Exception as error:
+        return None, error, time.perf_counter() - start
+
+
+def take_snapshot(grab, functions):
+    """Grabs one frame and evaluates {name: function} on the snapshot thread pool."""
+    timestamp = time.time()
+    start = time.perf_counter()
+    grab()
+    grab_time = time.perf_counter() - start
+    futures = [(name, executor("snapshot").submit(_timed, function)) for name, function in functions.items()]
+    values, timings, errors = {}, {}, {}
+    for name, future in futures:
+        values[name], error, timings[name] = future.result()
+        if error is not None:
+            errors[name] = error
+    return Snapshot(timestamp, grab_time, values, timings, errors)
+
+
+class CaptureLoop(object):
+    """Grabs the screen at a fixed rate in one asyncio task and shares the frames.
+
+    Any number of AsyncLibrary instances can use one loop, they crop their screen box out of
+    the shared frame instead of grabbing themselves. region defaults to the whole desktop.
+    """
+
+    def __init__(self, rate=10, region=None):
+        self.interval = 1. / rate
+        self.region = region
+        self.capture = CaptureSession()
+        self.frame = None
+        self.frame_id = 0
+        self._condition = None
+        self._task = None
+
+    def start(self):
+        if self._task is None:
+            self._condition = asyncio.Condition()
+            self._task = asyncio.ensure_future(self._run())
+        return self
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def next_frame(self, after=None):
+        """Waits for a frame newer than frame id after (default: the current one)."""
+        self.start()
+        after = self.frame_id if after is None else after
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.frame_id > after)
+            return self.frame
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time()
+        while True:
+            self.frame = await loop.run_in_executor(executor("capture"), self.capture.grab, self.region)
+            self.frame_id += 1
+            async with self._condition:
+                self._condition.notify_all()
+            deadline = max(deadline + self.interval, loop.time())
+            await asyncio.sleep(deadline - loop.time())
+
+
+class AsyncLibrary(object):
+    """asyncio front end of a generated library.
+
+    Box functions run on an executor, so OCR and matching do not block the event loop. With
+    a capture_loop, frames come from the shared loop instead of a grab per library.
+    """
+
+    def __init__(self, library, capture_loop=None):
+        self.library = library
+        self.capture_loop = capture_loop
+
+    async def run(self, function, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor("async"), functools.partial(function, *args, **kwargs))
+
+    async def grab_screen(self):
+        if self.capture_loop is None:
+            return await self.run(self.library.grab_screen)
+        return self.library.set_frame(await self.capture_loop.next_frame())
+
+    async def snapshot(self):
+        if self.capture_loop is None:
+            return await self.run(self.library.snapshot)
+        frame = await self.capture_loop.next_frame()
+        return await self.run(self.library.snapshot, lambda: self.library.set_frame(frame))
+
+
+class BoxWatcher(object):
+    """Watches the screen and calls on_change(name, value) when a box function's value changes.
+
+    A thread grabs rate frames per second and compares each frame with the previous one.
+    Pixels that moved by more than noise mark their cell x cell cell as dirty, and only
+    functions whose box touches a dirty cell are evaluated again, so idle screens cost one
+    grab and one diff per frame. functions is {name: (function, [x, y, width, height])}.
+    """
+
+    def __init__(self, grab, functions, on_change, rate=10, cell=16, noise=CHANGE_NOISE):
+        self.grab = grab
+        self.functions = functions
+        self.on_change = on_change
+        self.interval = 1. / rate
+        self.cell = cell
+        self.noise = noise
+        self.values = {}
+        self.errors = {}
+        self.running = False
+        self._previous = None
+        self._thread = None
+
+    def start(self):
+        self.running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, wait=True):
+        self.running = False
+        if wait and self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+
+    def dirty_cells(self, image):
+        current = gray(numpy.asarray(image))
+        previous, self._previous = self._previous, current
+        rows, columns = -(-current.shape[0] // self.cell), -(-current.shape[1] // self.cell)
+        if previous is None or previous.shape != current.shape:
+            return numpy.ones((rows, columns), bool)
+        _, changed = cv2.threshold(cv2.absdiff(current, previous), self.noise, 255, cv2.THRESH_BINARY)
+        return cv2.resize(changed, (columns, rows), interpolation=cv2.INTER_AREA) > 0
+
+    def step(self):
+        dirty = self.dirty_cells(self.grab())
+        cell = self.cell
+        stale = {}
+        for name, (function, box) in self.functions.items():
+            x, y, width, height = [int(value) for value in box]
+            if dirty[y // cell:-(-(y + height) // cell), x // cell:-(-(x + width) // cell)].any():
+                stale[name] = function
+        futures = [(name, executor("snapshot").submit(_timed, function)) for name, function in stale.items()]
+        for name, future in futures:
+            value, error, _ = future.result()
+            if error is not None:
+                self.errors[name] = error
+                continue
+            if name not in self.values or self.values[name] != value:
+                self.values[name] = value
+                self.on_change(name, value)
+        return list(stale)
+
+    def _run(self):
+        deadline = time.perf_counter()
+        while self.running:
+            self.step()
+            deadline = max(deadline + self.interval, time.perf_counter())
+            time.sleep(max(deadline - time.perf_counter(), 0))
+
+
+_worker_tool = None
+
+
+def _ocr_worker_init():
+    global _worker_tool
+    _worker_tool = ocr_tool()
+
+
+def _ocr_worker(name, shape, kind):
+    memory = shared_memory.SharedMemory(name=name)
+    try:
+        image = Image.fromarray(numpy.ndarray(shape, numpy.uint8, buffer=memory.buf).copy())
+    finally:
+        memory.close()
+    return _worker_tool.image_to_string(image, lang="eng", builder=builder(kind))
+
+
+class OcrProcessPool(object):
+    """Runs OCR on a pool of worker processes, each with its own OCR tool.
+
+    Images are handed over in shared memory blocks, only their name and shape are pickled.
+    """
+
+    def __init__(self, processes=None):
+        from concurrent.futures import ProcessPoolExecutor
+        self.pool = ProcessPoolExecutor(processes, initializer=_ocr_worker_init)
+
+    def submit(self, image, kind):
+        array = numpy.ascontiguousarray(numpy.asarray(image, numpy.uint8))
+        memory = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        numpy.ndarray(array.shape, numpy.uint8, buffer=memory.buf)[...] = array
+        future = self.pool.submit(_ocr_worker, memory.name, array.shape, kind)
+
+        def release(_):
+            memory.close()
+            memory.unlink()
+        future.add_done_callback(release)
+        return future
+
+    def image_to_string(self, image, kind):
+        return self.submit(image, kind).result()
+
+    def read_all(self, items):
+        """Recognizes [(name, kind, image)] in parallel, returns {name: value} like read_text_batch."""
+        futures = [(name, kind, self.submit(image, kind)) for name, kind, image in items]
+        return {name: parse_number(future.result()) if kind == "number" else future.result()
+                for name, kind, future in futures}
+
+    def shutdown(self):
+        self.pool.shutdown()
@@ -0,0 +1,109 @@
+import cv2
+import numpy
+import hashlib
+from PIL import Image
+
+from Models.Runtime import match_variants, peaks, enhance, builder, parse_number, executor
+
+MATCH_THRESHOLDS = numpy.arange(1, 101)
+TEXT_THRESHOLDS = numpy.arange(0, 256, 8)
+
+
+def sample(names, count):
+    """At most count names spread evenly over names."""
+    if len(names) <= count:
+        return list(names)
+    return [names[int(i)] for i in numpy.linspace(0, len(names) - 1, count)]
+
+
+def crop(frame, box):
+    return frame[int(box[1]):int(box[1] + box[3]), int(box[0]):int(box[0] + box[2])]
+
+
+def middle(values, best):
+    """Index of the middle of the values equal to best, the value in the centre of a plateau."""
+    indexes = numpy.flatnonzero(values >= best)
+    return indexes[len(indexes) // 2]
+
+
+def match_scores(frames, box, templates, candidates=16):
+    """Scores of the candidates best local maxima of the match response of every frame."""
+    scores = []
+    for frame in frames:
+        cropped = cv2.cvtColor(crop(frame, box), cv2.COLOR_BGR2BGRA)
+        angle, res = match_variants(cropped, templates)
+        scores.extend(score for _, _, score in peaks(res, -1., templates[angle].shape, candidates))
+    return numpy.array(scores)
+
+
+def tune_match(frames, box, templates, thresholds=MATCH_THRESHOLDS):
+    """Suggests the match_threshold (percent) that best separates hits from misses.
+
+    The match response of every frame is computed once and reduced to the scores of its
+    peaks, then all thresholds are tested at once against those scores. The suggested
+    threshold maximises the variance between the scores above and below it (Otsu), so it
+    lies in the middle of the widest gap between matches and background. Returns a dict with
+    the threshold (None when the scores can not be split), hits and misses.
+    """
+    scores = match_scores(frames, box, templates)
+    if len(scores) == 0:
+        return {"threshold": None, "hits": 0, "misses": 0}
+    cuts = thresholds / 100.
+    above = scores[None, :] >= cuts[:, None]
+    count = above.sum(axis=1)
+    total = len(scores)
+    above_sum = (above * scores[None, :]).sum(axis=1)
+    above_mean = above_sum / numpy.maximum(count, 1)
+    below_mean = (scores.sum() - above_sum) / numpy.maximum(total - count, 1)
+    variance = count * (total - count) / float(total * total) * (above_mean - below_mean) ** 2
+    if variance.max() <= 0:
+        return {"threshold": None, "hits": 0, "misses": total}
+    best = middle(variance, variance.max())
+    return {"threshold": int(thresholds[best]), "hits": int(count[best]), "misses": int(total - count[best])}
+
+
+def read(tool, binary, kind):
+    text = tool.image_to_string(Image.fromarray(binary), lang="eng", builder=builder(kind))
+    return parse_number(text) if kind == "number" else text.strip()
+
+
+def tune_text(tool, frames, box, kind, thresholds=TEXT_THRESHOLDS):
+    """Suggests the OCR threshold whose output is the most stable over frames.
+
+    The crops are enhanced once. Two thresholds give the same binary image exactly when no
+    pixel value lies between them, so the thresholds are grouped by the number of distinct
+    pixel values below them and every distinct binary image is recognized once, in parallel
+    on the "ocr" thread pool. A threshold scores the number of neighbouring thresholds with
+    the same non empty output, summed over the frames. Returns a dict with the threshold
+    (None when nothing was recognized), the texts at that threshold and the number of OCR calls.
+    """
+    thresholds = numpy.asarray(thresholds)
+    binaries, frame_keys = {}, []
+    for frame in frames:
+        image = enhance(crop(frame, box))
+        groups = numpy.searchsorted(numpy.unique(image), thresholds)
+        keys = numpy.empty(len(thresholds), object)
+        for group in numpy.unique(groups):
+            binary = numpy.where(image >= thresholds[groups == group][0], 255, 0).astype(numpy.uint8)
+            key = hashlib.blake2b(binary.tobytes(), digest_size=16).digest()
+            binaries.setdefault(key, binary)
+            keys[groups == group] = key
+        frame_keys.append(keys)
+
+    recognized = dict(zip(binaries, executor("ocr").map(lambda binary: read(tool, binary, kind), binaries.values())))
+    stability = numpy.zeros(len(thresholds))
+    outputs = []
+    for keys in frame_keys:
+        texts = numpy.empty(len(thresholds), object)
+        texts[:] = [recognized[key] for key in keys]
+        changed = numpy.r_[True, texts[1:] != texts[:-1]]
+        runs = numpy.cumsum(changed) - 1
+        lengths = numpy.bincount(runs)[runs]
+        empty = numpy.array([text is None or text == "" for text in texts])
+        stability += numpy.where(empty, 0, lengths)
+        outputs.append(texts)
+
+    if not outputs or stability.max() <= 0:
+        return {"threshold": None, "texts": [], "calls": len(binaries)}
+    best = middle(stability, stability.max())
+    return {"threshold": int(thresholds[best]), "texts": [texts[best] for texts in outputs], "calls": len(binaries)}
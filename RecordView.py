@@ -1,11 +1,11 @@
 import os
-import time
 import cv2
-import _thread
 import mss
-import mss.tools
 
-from PyQt5 import uic, QtWidgets
+from Models.Recorder import Recorder
+from Models.Runtime import STORE_RAW, STORE_ZLIB
+
+from PyQt5 import uic, QtWidgets, QtCore
 from PyQt5.QtCore import pyqtSignal
 from datetime import datetime
 
@@ -14,6 +14,24 @@ qtViewFile = "./Design/Record.ui"  # Enter file here.
 Ui_MainWindow, QtBaseClass = uic.loadUiType(qtViewFile)
 
 
+class RecorderThread(QtCore.QThread):
+    """Runs a Recorder and reports its stats() through the progress signal."""
+
+    progress = pyqtSignal(dict)
+
+    def __init__(self, recorder, parent=None):
+        super(RecorderThread, self).__init__(parent)
+        self.recorder = recorder
+
+    def run(self):
+        self.recorder.run(callback=self.progress.emit)
+
+    def stop(self, wait=False):
+        self.recorder.stop()
+        if wait:
+            self.wait()
+
+
 class CreateView(QtWidgets.QMainWindow, Ui_MainWindow):
 
     clicked_analyse = pyqtSignal()
@@ -21,8 +39,7 @@ class CreateView(QtWidgets.QMainWindow, Ui_MainWindow):
 
     def __init__(self):
         self.box = 0
-        self.capture_screen = False
-        self.sct = mss.mss()
+        self.recorder_thread = None
 
         QtWidgets.QMainWindow.__init__(self)
         Ui_MainWindow.__init__(self)
@@ -36,10 +53,13 @@ class CreateView(QtWidgets.QMainWindow, Ui_MainWindow):
         self.fullsc_radb.setChecked(True)
         self.fullsc_radb.toggled.connect(self.full_screen_radb)
         self.boxsc_radb.toggled.connect(self.box_screen_radb)
+        self.store_chb.toggled.connect(self.compress_chb.setEnabled)
+        self.dedupe_chb.toggled.connect(self.dedupe_tolerance_sb.setEnabled)
 
     def onclicked_start(self):
         print("start", self.frequency_spin_box.value())
-        self.capture_screen = True
+        if self.recorder_thread and self.recorder_thread.isRunning():
+            return
         speed = self.frequency_spin_box.value()
         if speed <= 0:
             speed = 200
@@ -53,33 +73,37 @@ class CreateView(QtWidgets.QMainWindow, Ui_MainWindow):
         if not os.path.exists(directory):
             os.makedirs(directory)
 
-        _thread.start_new_thread(self.record_screen, (folder_name, speed))
-
-    def record_screen(self, folder_name, speed):
-        counter = 0
-
-        speed = 1./speed
-
-        if isinstance(self.box, int):
-            while self.capture_screen:
-                self.sct.shot(mon=0, output="./" + folder_name + "/" + str(counter) + ".png")
-                time.sleep(speed)
-                counter += 1
-        else:
-            while self.capture_screen:
-                sct_img = self.sct.grab(self.box)
-                mss.tools.to_png(sct_img.rgb, sct_img.size, output="./" + folder_name + "/" + str(counter) + ".png")
-                time.sleep(speed)
-                counter += 1
-            with open("./" + folder_name + "/box.txt", 'w') as file:
-                file.write("{}\n".format(self.box))
-
-        self.number_of_img_l.setText("Number of screenshots: {}".format(counter))
+        recorder = Recorder(
+            directory, speed, self.box,
+            store=self.store_chb.isChecked(),
+            compression=STORE_ZLIB if self.compress_chb.isChecked() else STORE_RAW,
+            dedupe=self.dedupe_chb.isChecked(),
+            tolerance=self.dedupe_tolerance_sb.value()
+        )
+        self.recorder_thread = RecorderThread(recorder, self)
+        self.recorder_thread.progress.connect(self.show_progress)
+        self.recorder_thread.start()
+
+    def show_progress(self, stats):
+        self.number_of_img_l.setText(
+            "Number of screenshots: {} (deduplicated: {}, dropped: {}, skipped: {})\n"
+            "{:.1f} fps, queue: {}, written: {:.1f} MB".format(
+                stats["written"], stats["deduplicated"], stats["dropped"], stats["skipped"],
+                stats["fps"], stats["queue"], stats["bytes"] / 1024. / 1024.
+            ))
+        if stats["error"]:
+            self.number_of_img_l.setText("{}\nRecording stopped, {} frames failed: {}".format(
+                self.number_of_img_l.text(), stats["failed"], stats["error"]
+            ))
 
     def onclicked_stop(self):
-        self.capture_screen = False
+        self.stop_recording()
         print("stop")
 
+    def stop_recording(self, wait=False):
+        if self.recorder_thread:
+            self.recorder_thread.stop(wait)
+
     def onclicked_analyse(self):
         self.clicked_analyse.emit()
 
@@ -90,7 +114,8 @@ class CreateView(QtWidgets.QMainWindow, Ui_MainWindow):
 
     def box_screen_radb(self):
         if self.boxsc_radb.isChecked():
-            self.sct.shot(mon=-1, output='./image.png')
+            with mss.mss() as sct:
+                sct.shot(mon=-1, output='./image.png')
 
             img = cv2.imread('./image.png')
 
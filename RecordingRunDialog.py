@@ -0,0 +1,107 @@
+import time
+
+from PyQt5 import uic, QtWidgets, QtCore
+from PyQt5.QtCore import pyqtSignal
+from PyQt5.QtWidgets import QFileDialog, QMessageBox
+
+
+class RecordingRunThread(QtCore.QThread):
+    """Runs a RecordingRunner, the rows of every finished chunk are sent through the rows signal."""
+
+    rows = pyqtSignal(list)
+    failed = pyqtSignal(str)
+
+    def __init__(self, runner, parent=None):
+        super(RecordingRunThread, self).__init__(parent)
+        self.runner = runner
+
+    def run(self):
+        try:
+            self.runner.run(callback=self.rows.emit)
+        except Exception as error:
+            self.failed.emit(repr(error))
+
+    def stop(self, wait=False):
+        self.runner.stop()
+        if wait:
+            self.wait()
+
+
+class SortItem(QtWidgets.QTableWidgetItem):
+    """Table item that sorts by key instead of by its text."""
+
+    def __init__(self, text, key):
+        super(SortItem, self).__init__(text)
+        self.key = key
+
+    def __lt__(self, other):
+        return self.key < other.key
+
+
+class RecordingRunDialog(QtWidgets.QDialog):
+    def __init__(self, runner):
+        super(RecordingRunDialog, self).__init__()
+        uic.loadUi('./Design/RecordingRun.ui', self)
+        self.setWindowTitle("Run {} over recording".format(runner.function))
+
+        self.runner = runner
+        self.order = {name: i for i, name in enumerate(runner.names)}
+        self.errors = 0
+        self.call_time = 0.
+        self.started = time.perf_counter()
+
+        self.progress_pb.setMaximum(len(runner))
+        self.results_tw.horizontalHeader().setStretchLastSection(True)
+        self.stop_bt.clicked.connect(self.stop_press)
+        self.export_bt.clicked.connect(self.export_press)
+
+        self.thread = RecordingRunThread(runner, self)
+        self.thread.rows.connect(self.add_rows)
+        self.thread.failed.connect(lambda error: QMessageBox.about(self, 'Run over recording', error))
+        self.thread.finished.connect(self.run_finished)
+        self.thread.start()
+
+    def add_rows(self, rows):
+        table = self.results_tw
+        row = table.rowCount()
+        table.setRowCount(row + len(rows))
+        for name, value, decode_time, call_time, error in rows:
+            value = "" if value is None else str(value)
+            cells = [(name, self.order[name]), (value, value),
+                     ("{:.2f}".format(decode_time * 1000), decode_time),
+                     ("{:.2f}".format(call_time * 1000), call_time), (error, error)]
+            for column, (text, key) in enumerate(cells):
+                table.setItem(row, column, SortItem(text, key))
+            row += 1
+            self.errors += bool(error)
+            self.call_time += call_time
+        self.progress_pb.setValue(row)
+        self.summary_lb.setText("{} of {} frames, {} errors, mean call {:.2f} ms, {:.1f} s".format(
+            row, len(self.runner), self.errors, self.call_time / row * 1000, time.perf_counter() - self.started
+        ))
+
+    def run_finished(self):
+        self.stop_bt.setEnabled(False)
+        self.results_tw.setSortingEnabled(True)
+        self.results_tw.sortItems(0)
+
+    def stop_press(self):
+        self.stop_bt.setEnabled(False)
+        self.thread.stop()
+
+    def export_press(self):
+        path, _ = QFileDialog.getSaveFileName(
+            self,
+            "Export results",
+            self.runner.folder,
+            "CSV Files (*.csv)"
+        )
+        if not path:
+            return
+        if path[-4:] != ".csv":
+            path += ".csv"
+        self.runner.write_csv(path)
+
+    def done(self, result):
+        self.thread.stop(wait=True)
+        super(RecordingRunDialog, self).done(result)
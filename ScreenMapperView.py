@@ -1,13 +1,14 @@
 import os
 import cv2
-import sys
-import importlib
 
 from ImageViewerQt import ImageViewerQt
 from FunctionDialog import FunctionDialog
-from Models.Library import Library
+from RecordingRunDialog import RecordingRunDialog
+from Models.Library import Library, manifest_path
+from Models.LibraryHost import LibraryHost
+from Models.RecordingRunner import RecordingRunner
+from Models.FrameStore import Recording
 
-from os import listdir
 from PyQt5 import uic, QtWidgets, QtCore, QtGui
 from PyQt5.QtCore import pyqtSignal
 from PyQt5.QtWidgets import QFileDialog, QMessageBox
@@ -62,6 +63,7 @@ class ScreenMapperView(QtWidgets.QMainWindow, Ui_StartWindow):
     def __init__(self):
 
         self.folder = None
+        self.recording = None
         self.library = None
 
         QtWidgets.QMainWindow.__init__(self)
@@ -71,10 +73,21 @@ class ScreenMapperView(QtWidgets.QMainWindow, Ui_StartWindow):
         self.box_functions = []
         self.box = None
         self.position_img = None
+        self.library_writer = None
+        self.library_host = None
+
+        # create_lib only restarts this timer, so a burst of edits writes the library once
+        self.save_timer = QtCore.QTimer(self)
+        self.save_timer.setSingleShot(True)
+        self.save_timer.setInterval(500)
+        self.save_timer.timeout.connect(self.write_lib)
 
         self.rename_lib_ml.triggered.connect(self.change_name_press)
         self.screenshots_folder_ml.triggered.connect(self.switch_function_press)
+        self.async_api_ml.triggered.connect(self.create_lib)
+        self.run_recording_ml.triggered.connect(self.run_recording_press)
 
+        self.cancel_bt.clicked.connect(self.flush_lib)
         self.cancel_bt.clicked.connect(self.clicked_cancel.emit)
         self.save_image_bt.clicked.connect(self.save_image_press)
         self.add_function_bt.clicked.connect(self.add_function_press)
@@ -119,22 +132,35 @@ class ScreenMapperView(QtWidgets.QMainWindow, Ui_StartWindow):
             if "position_image" in arguments[2]:
                 self.position_img = arguments[2]["position_image"]
                 self.position_img_bt.setText("Position image is set")
+            self.async_api_ml.setChecked(bool(arguments[2].get("async_api")))
         self.name_l.setText(self.library)
         self.box_functions = functions
         for fun in functions:
             self.add_function(fun)
-        files = [file for file in listdir(self.folder) if file[-4:] == ".png"]
+        self.load_recording()
+
+    def load_recording(self):
+        self.recording = Recording(self.folder)
         self.screens_cb.clear()
-        self.screens_cb.addItems(files)
-        self.screens_cb.model().sort(0)
+        self.screens_cb.addItems(self.recording.names)
         self.screens_cb.setCurrentIndex(0)
         if os.path.isfile(self.folder + "/box.txt"):
             with open(self.folder + "/box.txt", 'r') as f:
                 self.box = eval(f.readline())
 
+    def current_frame(self):
+        return self.recording.frame(self.screens_cb.currentText())
+
     def screen_changed(self, i):
-        image = self.folder+"/"+self.screens_cb.currentText()
-        self.image_view.loadImageFromFile(image)
+        if i < 0:
+            return
+        path = self.recording.path(self.screens_cb.currentText())
+        if path:
+            self.image_view.loadImageFromFile(path)
+        else:
+            frame = cv2.cvtColor(self.current_frame(), cv2.COLOR_BGR2RGB)
+            image = QtGui.QImage(frame.data, frame.shape[1], frame.shape[0], frame.strides[0], QtGui.QImage.Format_RGB888)
+            self.image_view.setImage(QtGui.QPixmap.fromImage(image))
         print(self.folder+"/"+self.screens_cb.currentText())
 
     # A key has been pressed!
@@ -152,7 +178,7 @@ class ScreenMapperView(QtWidgets.QMainWindow, Ui_StartWindow):
 
     def position_from_image(self):
             box = self.image_view.getBoxDimensions()
-            img = cv2.imread(self.folder + "/" + self.screens_cb.currentText())
+            img = self.current_frame()
 
             imCrop = img[int(box[1]):int(box[1] + box[3]), int(box[0]):int(box[0] + box[2])]
 
@@ -168,7 +194,7 @@ class ScreenMapperView(QtWidgets.QMainWindow, Ui_StartWindow):
     def save_image_press(self):
 
         box = self.image_view.getBoxDimensions()
-        img = cv2.imread(self.folder+"/"+self.screens_cb.currentText())
+        img = self.current_frame()
 
         imCrop = img[int(box[1]):int(box[1] + box[3]), int(box[0]):int(box[0] + box[2])]
 
@@ -187,7 +213,7 @@ class ScreenMapperView(QtWidgets.QMainWindow, Ui_StartWindow):
         box = self.image_view.getBoxDimensions()
 
         if box:
-            dialog = FunctionDialog(box, self.folder, (self.folder+"/"+self.screens_cb.currentText()))
+            dialog = FunctionDialog(box, self.recording, self.screens_cb.currentText())
             if dialog.exec_():
                 function_box = dialog.get_function()
                 self.box_functions.append(function_box)
@@ -200,7 +226,7 @@ class ScreenMapperView(QtWidgets.QMainWindow, Ui_StartWindow):
         box = self.box_functions[index].box
 
         dialog = FunctionDialog(
-            box, self.folder, (self.folder+"/"+self.screens_cb.currentText()), function=self.box_functions[index]
+            box, self.recording, self.screens_cb.currentText(), function=self.box_functions[index]
         )
         if dialog.exec_():
             function_box = dialog.get_function()
@@ -233,6 +259,7 @@ class ScreenMapperView(QtWidgets.QMainWindow, Ui_StartWindow):
         self.create_lib()
 
     def run_function_press(self):
+        self.flush_lib()
         index = self.box_function_lw.currentRow()
         if index > -1:
             function = self.box_functions[index]
@@ -243,32 +270,42 @@ class ScreenMapperView(QtWidgets.QMainWindow, Ui_StartWindow):
                 if function.type == "game_box":
                     self.image_view.update_function_box(function.box)
 
-                text_to_run = "sys.path.append('{}')\n"\
-                     "import {}\n"\
-                     "importlib.reload({})\n"\
-                     "print('library imported')\n"\
-                     "library = {}.{}()\n"\
-                     "library.grab_file('{}')\n"\
-                     "result = library.{}()\n"\
-                     "QMessageBox.about(self, 'Run function', 'Function {} from class {} returns '+str(result))".format(
-                        self.library[:-len(lib)],
-                        lib[:-3], lib[:-3], lib[:-3], lib[:-3],
-                        (self.folder+"/"+self.screens_cb.currentText()),
-                        self.box_functions[index].name,
-                        self.box_functions[index].name, lib)
-                print(text_to_run)
-                exec(text_to_run)
+                if self.library_writer is None:
+                    self.write_lib()
+                if self.library_host is None:
+                    self.library_host = LibraryHost()
+                try:
+                    result, elapsed = self.library_host.run(
+                        self.library_writer, function, self.recording, self.screens_cb.currentText()
+                    )
+                except Exception as error:
+                    QMessageBox.about(self, 'Run function', 'Function {} from class {} failed: {!r}'.format(
+                        function.name, lib, error
+                    ))
+                    return
+                QMessageBox.about(self, 'Run function', 'Function {} from class {} returns {}\n\nTook {:.2f} ms'.format(
+                    function.name, lib, result, elapsed * 1000
+                ))
+
+    def run_recording_press(self):
+        index = self.box_function_lw.currentRow()
+        if index < 0:
+            QMessageBox.about(self, 'Run over recording', 'Select the function to run first')
+            return
+        function = self.box_functions[index]
+        if function.type == "change" or function.type == "click":
+            QMessageBox.about(self, 'Run over recording', 'Function {} can not be runned over a recording'.format(function.name))
+            return
+        self.flush_lib()
+        if self.library_writer is None:
+            self.write_lib()
+        runner = RecordingRunner(self.library_writer.path, self.library_writer.name, self.folder, function.name)
+        RecordingRunDialog(runner).exec_()
 
     def switch_function_press(self):
 
         self.folder = str(QFileDialog.getExistingDirectory(self, "Select Directory"))
-        files = [file for file in listdir(self.folder) if file[-4:] == ".png"]
-        self.screens_cb.clear()
-        self.screens_cb.addItems(files)
-        self.screens_cb.setCurrentIndex(0)
-        if os.path.isfile(self.folder + "/box.txt"):
-            with open(self.folder + "/box.txt", 'r') as f:
-                self.box = eval(f.readline())
+        self.load_recording()
 
     def show_box(self):
         box = self.box_functions[self.box_function_lw.currentRow()].box
@@ -285,16 +322,26 @@ class ScreenMapperView(QtWidgets.QMainWindow, Ui_StartWindow):
             directory += ".py"
         if os.path.exists(self.library):
             os.remove(self.library)
+        if os.path.exists(manifest_path(self.library)):
+            os.remove(manifest_path(self.library))
         self.library = directory
         self.name_l.setText(self.library)
         self.create_lib()
 
     def create_lib(self):
-        Library.create_library(
-            self.library,
-            self.box,
-            self.folder,
-            self.box_functions,
-            {"position_image": self.position_img}
-        )
+        self.save_timer.start()
+
+    def flush_lib(self):
+        if self.save_timer.isActive():
+            self.write_lib()
+
+    def write_lib(self):
+        self.save_timer.stop()
+        if self.library_writer is None or self.library_writer.destination != self.library:
+            self.library_writer = Library(self.library, self.box, self.folder, self.box_functions, {})
+        self.library_writer.screen_box = self.box
+        self.library_writer.directory = self.folder
+        self.library_writer.functions = self.box_functions
+        self.library_writer.dict = {"position_image": self.position_img, "async_api": self.async_api_ml.isChecked()}
+        self.library_writer.write()
 